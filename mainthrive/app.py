@@ -1,7 +1,19 @@
 # app.py
 import json
+import math
 import os
+import threading
+import time
 import numpy as np
+from rental_index import RentalIndex
+from rental_ranking import MarketCandidates
+from rental_snapshot import RentalSnapshot
+from rental_store import RentalFile, StaleRentalFileError
+from response_cache import ResponseCache
+
+RENTALS_PATH = 'zillow_rentals.json'
+# Binary snapshot compiled from RENTALS_PATH by load_zillow_data.py
+SNAPSHOT_PATH = 'zillow_rentals.snapshot'
 
 # Create a sample zillow_rentals.json file if it doesn't exist
 def create_sample_data():
@@ -44,8 +56,116 @@ def create_sample_data():
             print(f"Error loading zillow_rentals.json: {e}")
             return []
 
+def data_version(path=RENTALS_PATH):
+    """Identify the current rental dataset by its file's mtime and size"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return '0'
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+def snapshot_is_current():
+    """True if a snapshot exists and is at least as new as the JSON it was compiled from"""
+    if not os.path.exists(SNAPSHOT_PATH):
+        return False
+    if not os.path.exists(RENTALS_PATH):
+        return True
+    return os.path.getmtime(SNAPSHOT_PATH) >= os.path.getmtime(RENTALS_PATH)
+
+def load_rental_index():
+    """
+    Index listings by state and city once so lookups only touch matching
+    listings. Memory-maps the binary snapshot when it is current; otherwise
+    scans the JSON file, keeping only the index columns and each listing's
+    offset in the file.
+    """
+    if snapshot_is_current():
+        try:
+            snapshot = RentalSnapshot(SNAPSHOT_PATH)
+            print(f"Memory-mapped {len(snapshot)} rental listings from {SNAPSHOT_PATH}")
+            return RentalIndex.from_snapshot(snapshot, version=data_version(SNAPSHOT_PATH))
+        except (OSError, ValueError) as e:
+            print(f"Error loading {SNAPSHOT_PATH}, falling back to JSON: {e}")
+
+    if not os.path.exists(RENTALS_PATH):
+        create_sample_data()
+    try:
+        rentals = RentalFile(RENTALS_PATH)
+    except (OSError, ValueError) as e:
+        print(f"Error loading {RENTALS_PATH}: {e}")
+        return RentalIndex([], version=data_version())
+    if rentals.unparsed_prices:
+        print(f"Skipped {rentals.unparsed_prices} unit prices that could not be parsed")
+    return RentalIndex.from_snapshot(rentals, version=data_version())
+
 # Load Zillow rentals data
-rentals_data = create_sample_data()
+rental_index = load_rental_index()
+rentals_data = rental_index.rentals
+
+# Serialized responses for repeated queries, keyed by the dataset version
+response_cache = ResponseCache(max_entries=int(os.getenv('RENTAL_API_CACHE_SIZE', 256)))
+
+def set_rental_index(index):
+    """
+    Swap in a new dataset. Handlers read `rental_index` once per request, so
+    requests already running finish against the index they started with.
+    """
+    global rental_index, rentals_data
+    rental_index = index
+    rentals_data = index.rentals
+    response_cache.invalidate()
+
+def data_signature():
+    """Inode, mtime and size of the rental data files, to detect replacements"""
+    signature = []
+    for path in (SNAPSHOT_PATH, RENTALS_PATH):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+class RentalDataWatcher(threading.Thread):
+    """
+    Polls the rental data files and, when they change, builds the new index
+    on this background thread before swapping it in with set_rental_index.
+    A change is only picked up once the files have stayed the same for a
+    whole interval, so a loader that is still writing isn't read half-way.
+    The prefork supervisor calls poll() itself instead of starting the thread.
+    """
+
+    def __init__(self, interval=5.0):
+        super().__init__(name='rental-data-watcher', daemon=True)
+        self.interval = interval
+        self.signature = data_signature()
+        self.pending = None
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.poll()
+
+    def poll(self):
+        """Check the files once; returns True if a new dataset was swapped in"""
+        signature = data_signature()
+        if signature == self.signature:
+            self.pending = None
+            return False
+        if signature != self.pending:
+            self.pending = signature
+            return False
+        self.signature = signature
+        self.pending = None
+        started = time.time()
+        try:
+            index = load_rental_index()
+        except Exception as e:
+            print(f"Error reloading rental data: {e}")
+            return False
+        set_rental_index(index)
+        print(f"Reloaded {len(index.rentals)} rental listings in {time.time() - started:.2f}s")
+        return True
 
 # Sample training data for affordability scoring (example)
 X_train = np.array([
@@ -57,137 +177,593 @@ y_train = np.array([4.5, 7.0, 9.5])  # Affordability scores
 
 class SimpleModel:
     def fit(self, X, y):
-        self.X = X
-        self.y = y
+        self.X = np.asarray(X, dtype=np.float64)
+        self.y = np.asarray(y)
         
-    def predict(self, X):
-        predictions = []
-        for x in X:
-            distances = np.sum((self.X - x) ** 2, axis=1)
-            closest_idx = np.argmin(distances)
-            predictions.append(self.y[closest_idx])
-        return np.array(predictions)
+    def predict(self, X, chunk_size=4096):
+        # Nearest training row for every query at once, a chunk of queries at
+        # a time so the distance matrix stays small for large batches
+        X = np.asarray(X, dtype=np.float64)
+        predictions = np.empty(len(X), dtype=self.y.dtype)
+        for start in range(0, len(X), chunk_size):
+            chunk = X[start:start + chunk_size]
+            distances = np.sum((self.X[None, :, :] - chunk[:, None, :]) ** 2, axis=2)
+            predictions[start:start + chunk_size] = self.y[np.argmin(distances, axis=1)]
+        return predictions
 
 model = SimpleModel()
 model.fit(X_train, y_train)
 
+# Share of monthly income available for housing, by housing_budget_percentage
+BUDGET_FACTORS = {"less-than-30": 0.3, "30-40": 0.4, "40-plus": 0.5}
+# Recommendations returned per profile by default, and at most
+RECOMMENDATION_LIMIT = 20
+MAX_RECOMMENDATION_LIMIT = 100
+# Markets one request can compare
+MAX_MARKETS = 20
+
 def handle_rentals_request(city=None, state=None):
-    filtered_rentals = [
-        rental for rental in rentals_data 
-        if (not city or city.lower() in rental.get('addressCity', '').lower()) and 
-           (not state or state.upper() == rental.get('addressState', ''))
-    ]
-    return filtered_rentals
+    index = rental_index
+    positions = index.lookup(city, state)
+    return index.listings(positions)
 
-def handle_recommendations_request(data):
+def parse_markets(targets):
     """
-    Generate personalized housing recommendations.
-    Expects data with keys: city, state, income, savings, household_size,
-    healthcare_required, housing_budget_percentage, transportation_preference, amenities.
+    Read a request's "markets" list of {"city", "state"} objects (or
+    [city, state] pairs) into (city, state) tuples, or an (error, status) tuple.
+    """
+    if not isinstance(targets, list) or not targets:
+        return {"error": "markets must be a non-empty list"}, 400
+    if len(targets) > MAX_MARKETS:
+        return {"error": f"At most {MAX_MARKETS} markets per request"}, 400
+    markets = []
+    for target in targets:
+        if isinstance(target, dict):
+            city, state = target.get("city"), target.get("state")
+        elif isinstance(target, list) and len(target) == 2:
+            city, state = target
+        else:
+            city = state = None
+        if not city or not state or not isinstance(city, str) or not isinstance(state, str):
+            return {"error": "Each market needs a city and state"}, 400
+        markets.append((city, state))
+    return markets
+
+def parse_profile(data):
+    """
+    Read one recommendation request into a profile dict with its monthly
+    housing budget. Returns an (error, status) tuple if the request is invalid.
     """
     if not data:
         return {"error": "No input data provided"}, 400
+    if not isinstance(data, dict):
+        return {"error": "Each profile must be a JSON object"}, 400
 
     city = data.get("city")
     state = data.get("state")
-    if not city or not state:
+    if "markets" in data:
+        markets = parse_markets(data["markets"])
+        if isinstance(markets, tuple):
+            return markets
+    elif not city or not state:
         return {"error": "City and State are required"}, 400
+    elif not isinstance(city, str) or not isinstance(state, str):
+        return {"error": "City and State must be strings"}, 400
+    else:
+        markets = [(city, state)]
+
+    try:
+        limit = int(data.get("limit", RECOMMENDATION_LIMIT))
+        offset = int(data.get("offset", 0))
+    except (TypeError, ValueError, OverflowError):
+        return {"error": "limit and offset must be integers"}, 400
+    if limit < 1 or offset < 0:
+        return {"error": "limit must be positive and offset non-negative"}, 400
+
+    try:
+        income = float(data.get("income", 50000))
+        savings = float(data.get("savings", 10000))
+        household_size = int(data.get("household_size", 1))
+        if not math.isfinite(income) or not math.isfinite(savings):
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        return {"error": "income, savings and household_size must be numbers"}, 400
 
-    income = float(data.get("income", 50000))
-    savings = float(data.get("savings", 10000))
-    household_size = int(data.get("household_size", 1))
-    healthcare_required = bool(data.get("healthcare_required", False))
     housing_budget_percentage = data.get("housing_budget_percentage", "less-than-30")
-    transportation_preference = data.get("transportation_preference", "car")
-    amenities = data.get("amenities", {})
 
     # Calculate monthly income and housing budget.
     monthly_income = income / 12.0
-    # Define budget factor based on housing_budget_percentage
-    budget_factors = {"less-than-30": 0.3, "30-40": 0.4, "40-plus": 0.5}
-    factor = budget_factors.get(housing_budget_percentage, 0.3)
-    monthly_budget = monthly_income * factor
+    factor = BUDGET_FACTORS.get(housing_budget_percentage, 0.3)
 
-    # Use the simple model to get an affordability score (this can be enhanced)
-    features = np.array([[income, savings, household_size]])
-    affordability_score = float(model.predict(features)[0])
-
-    # Get rentals for the specified city and state
-    filtered_rentals = handle_rentals_request(city, state)
-    
-    # Filter rentals by checking if at least one unit's price is within the monthly budget.
-    affordable_rentals = []
-    for rental in filtered_rentals:
-        if "units" in rental and rental["units"]:
-            for unit in rental["units"]:
-                price_str = unit.get("price", "")
-                try:
-                    # Extract numeric part from price string, e.g. "$2,750" -> 2750
-                    price = float(price_str.replace("$", "").replace(",", "").strip())
-                    if price <= monthly_budget:
-                        affordable_rentals.append(rental)
-                        break  # At least one unit is affordable; include rental once.
-                except Exception as e:
-                    print(f"Error parsing price: {e}")
-    
-    # For demonstration, we attach the affordability score to the response.
     return {
         "city": city,
         "state": state,
-        "affordability_score": round(affordability_score, 2),
-        "monthly_budget": monthly_budget,
-        "recommendations": affordable_rentals[:20]  # Limit to 20 results
+        "markets": markets,
+        "multi_market": "markets" in data,
+        "income": income,
+        "savings": savings,
+        "household_size": household_size,
+        "healthcare_required": bool(data.get("healthcare_required", False)),
+        "housing_budget_percentage": housing_budget_percentage,
+        "transportation_preference": data.get("transportation_preference", "car"),
+        "amenities": data.get("amenities", {}),
+        "monthly_budget": monthly_income * factor,
+        "limit": min(limit, MAX_RECOMMENDATION_LIMIT),
+        "offset": offset,
     }
 
+def profile_features(profiles):
+    """Model feature matrix (income, savings, household_size) for profiles"""
+    return np.array([[profile["income"], profile["savings"], profile["household_size"]]
+                     for profile in profiles], dtype=np.float64).reshape(-1, 3)
+
+def market_key(profile):
+    """Normalized markets of a profile, for sharing candidates between profiles"""
+    return tuple((city.lower(), state.upper()) for city, state in profile["markets"])
+
+def lookup_markets(index, profile):
+    return MarketCandidates(index, [index.lookup(city, state) for city, state in profile["markets"]])
+
+def recommendation_head(profile, affordability_score, ranked):
+    """
+    The response without its listings. Multi-market requests get one entry
+    per market under "markets", each of which takes its own listings.
+    """
+    head = {}
+    if not profile["multi_market"]:
+        head["city"] = profile["city"]
+        head["state"] = profile["state"]
+    head["affordability_score"] = round(affordability_score, 2)
+    head["monthly_budget"] = profile["monthly_budget"]
+    if not profile["multi_market"]:
+        head["total_affordable"] = ranked[0][0]
+    head["limit"] = profile["limit"]
+    head["offset"] = profile["offset"]
+    return head
+
+def market_head(city, state, total_affordable):
+    return {"city": city, "state": state, "total_affordable": total_affordable}
+
+def recommendation_result(index, profile, affordability_score, ranked):
+    """Response dict for a profile's ranked (number affordable, positions) per market"""
+    result = recommendation_head(profile, affordability_score, ranked)
+    if not profile["multi_market"]:
+        result["recommendations"] = index.listings(ranked[0][1])
+        return result
+    result["markets"] = []
+    for (city, state), (total_affordable, positions) in zip(profile["markets"], ranked):
+        market = market_head(city, state, total_affordable)
+        market["recommendations"] = index.listings(positions)
+        result["markets"].append(market)
+    return result
+
+def handle_recommendations_request(data):
+    """
+    Generate personalized housing recommendations.
+    Expects data with keys: city, state, income, savings, household_size,
+    healthcare_required, housing_budget_percentage, transportation_preference, amenities,
+    and optionally limit/offset to page through the ranked listings.
+    Instead of city and state, "markets" can list several (city, state)
+    targets to compare; the budget and score are then computed once and
+    every market is ranked in the same pass.
+    """
+    profile = parse_profile(data)
+    if isinstance(profile, tuple):
+        return profile
+
+    # Use the simple model to get an affordability score (this can be enhanced)
+    affordability_score = float(model.predict(profile_features([profile]))[0])
+
+    # Rank the rentals in each requested city and state where at least one
+    # unit's pre-parsed price is within the monthly budget.
+    index = rental_index
+    ranked = lookup_markets(index, profile).rank(profile, profile["limit"], profile["offset"])
+
+    # For demonstration, we attach the affordability score to the response.
+    return recommendation_result(index, profile, affordability_score, ranked)
+
+def score_profiles(index, profiles):
+    """
+    Affordability scores and recommended positions for many profiles at once.
+    The model runs once over the whole feature matrix, and each distinct
+    set of markets is looked up once and shared by its profiles.
+    Returns a list aligned with `profiles` of (profile, score, ranked) or an
+    (error, status) tuple for invalid entries.
+    """
+    parsed = [parse_profile(data) for data in profiles]
+    valid = [i for i, profile in enumerate(parsed) if not isinstance(profile, tuple)]
+    scores = model.predict(profile_features([parsed[i] for i in valid]))
+
+    groups = {}
+    for i in valid:
+        groups.setdefault(market_key(parsed[i]), []).append(i)
+
+    results = list(parsed)
+    for i, score in zip(valid, scores):
+        results[i] = (parsed[i], float(score))
+    for members in groups.values():
+        candidates = lookup_markets(index, parsed[members[0]])
+        for i in members:
+            profile = parsed[i]
+            results[i] += (candidates.rank(profile, profile["limit"], profile["offset"]),)
+    return results
+
+def encode_recommendation(index, profile, affordability_score, ranked):
+    """Serialized recommendation response, byte-identical to json.dumps of the dict"""
+    head = json.dumps(recommendation_head(profile, affordability_score, ranked)).encode()
+    if not profile["multi_market"]:
+        return head[:-1] + b', "recommendations": ' + encode_rentals(index, ranked[0][1]) + b'}'
+    markets = []
+    for (city, state), (total_affordable, positions) in zip(profile["markets"], ranked):
+        market = json.dumps(market_head(city, state, total_affordable)).encode()
+        markets.append(market[:-1] + b', "recommendations": ' + encode_rentals(index, positions) + b'}')
+    return head[:-1] + b', "markets": [' + b', '.join(markets) + b']}'
+
+def handle_batch_recommendations_request(body, ndjson=False):
+    """
+    POST /api/scoring/recommendations/batch: score a JSON array (or NDJSON)
+    of recommendation requests together. Responses come back in input
+    order, streamed in the same format; invalid entries yield their error.
+    """
+    index = rental_index
+    try:
+        text = body.decode()
+        if ndjson or not text.lstrip().startswith('['):
+            ndjson = True
+            profiles = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            profiles = json.loads(text)
+    except ValueError:
+        return 400, JSON_HEADERS, json.dumps({"error": "Body must be a JSON array or NDJSON"}).encode()
+
+    results = score_profiles(index, profiles)
+
+    def encode(result):
+        if len(result) == 2:
+            return json.dumps(result[0]).encode()
+        return encode_recommendation(index, *result)
+
+    def chunks():
+        if not ndjson:
+            yield b'['
+        for start in range(0, len(results), STREAM_BATCH_SIZE):
+            encoded = [encode(result) for result in results[start:start + STREAM_BATCH_SIZE]]
+            if ndjson:
+                yield b'\n'.join(encoded) + b'\n'
+            else:
+                yield (b', ' if start else b'') + b', '.join(encoded)
+        if not ndjson:
+            yield b']'
+
+    content_type = 'application/x-ndjson' if ndjson else 'application/json'
+    return 200, [('Content-Type', content_type), ('Access-Control-Allow-Origin', '*')], chunks()
+
 # Simple HTTP server using BaseHTTPRequestHandler
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
+import argparse
+import asyncio
+import base64
 import json
+from http_servers import PooledHTTPServer, serve_asyncio, serve_prefork
 
-class RentalAPIHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        parsed_path = urlparse(self.path)
-        if parsed_path.path == '/api/rentals':
-            params = parse_qs(parsed_path.query)
-            city = params.get('city', [None])[0]
-            state = params.get('state', [None])[0]
-            results = handle_rentals_request(city, state)
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(results).encode())
-            return
-        self.send_response(404)
-        self.end_headers()
-    
-    def do_POST(self):
-        if self.path == '/api/scoring/recommendations':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode())
+JSON_HEADERS = [
+    ('Content-Type', 'application/json'),
+    ('Access-Control-Allow-Origin', '*'),
+]
+
+# Largest page a non-streamed paginated request may ask for
+MAX_PAGE_SIZE = 1000
+# Listings serialized per chunk when streaming
+STREAM_BATCH_SIZE = 256
+
+def encode_cursor(version, position):
+    """Opaque cursor pointing at the first listing position of the next page"""
+    return base64.urlsafe_b64encode(f"{version}:{position}".encode()).decode()
+
+def decode_cursor(cursor, version):
+    """Return the position a cursor resumes from, or None if invalid or from another dataset"""
+    try:
+        cursor_version, position = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit(':', 1)
+        position = int(position)
+    except ValueError:
+        return None
+    if cursor_version != version:
+        return None
+    return position
+
+# Results returned by /api/rentals/nearby when no limit is given
+DEFAULT_NEARBY_LIMIT = 100
+
+def handle_nearby_request(params):
+    """
+    GET /api/rentals/nearby: listings within `radius_km` (default 5) of
+    `lat`/`lng`, or inside `bbox=min_lat,min_lng,max_lat,max_lng`, optionally
+    limited to those with a unit at or under `max_price`. Results are in
+    dataset order, or nearest first with `sort=distance`, capped at `limit`.
+    Responds with {"count", "results"} plus "distances_km" for radius queries.
+    """
+    index = rental_index
+    try:
+        if 'bbox' in params:
+            min_lat, min_lng, max_lat, max_lng = (float(value) for value in params['bbox'][0].split(','))
+            if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+                raise ValueError
+            positions = index.within_bbox(min_lat, min_lng, max_lat, max_lng)
+            distances = None
+        else:
+            lat = float(params['lat'][0])
+            lng = float(params['lng'][0])
+            radius_km = float(params.get('radius_km', [5])[0])
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180 and 0 < radius_km < math.inf):
+                raise ValueError
+            positions, distances = index.nearby(lat, lng, radius_km)
+        max_price = params.get('max_price', [None])[0]
+        max_price = float(max_price) if max_price is not None else None
+        limit = min(int(params.get('limit', [DEFAULT_NEARBY_LIMIT])[0]), MAX_PAGE_SIZE)
+        if limit <= 0:
+            raise ValueError
+    except (KeyError, ValueError):
+        error = {"error": "Provide lat, lng and a positive radius_km, or bbox=min_lat,min_lng,max_lat,max_lng "
+                          "with latitudes within ±90, longitudes within ±180 and each min no greater than its max"}
+        return 400, JSON_HEADERS, json.dumps(error).encode()
+
+    if max_price is not None:
+        keep = index.min_price[positions] <= max_price
+        positions = positions[keep]
+        if distances is not None:
+            distances = distances[keep]
+
+    count = len(positions)
+    if distances is not None and params.get('sort', [None])[0] == 'distance':
+        # Only the nearest `limit` need ordering
+        if limit < count:
+            nearest = np.argpartition(distances, limit - 1)[:limit]
+            positions, distances = positions[nearest], distances[nearest]
+        order = np.lexsort((positions, distances))
+        positions, distances = positions[order], distances[order]
+
+    body = b'{"count": %d, "results": %s' % (count, encode_rentals(index, positions[:limit]))
+    if distances is not None:
+        body += b', "distances_km": ' + json.dumps(np.round(distances[:limit], 3).tolist()).encode()
+    return 200, JSON_HEADERS, body + b'}'
+
+def encode_rentals(index, positions):
+    """JSON array of listings, byte-identical to json.dumps of the list"""
+    return b'[' + b', '.join(index.encode_listings(positions)) + b']'
+
+def stream_listings(index, positions, ndjson=False):
+    """
+    Serialize listings a batch at a time, as one JSON array (byte-identical
+    to json.dumps of the full list) or as newline-delimited JSON.
+    """
+    if not ndjson:
+        yield b'['
+    for start in range(0, len(positions), STREAM_BATCH_SIZE):
+        encoded = index.encode_listings(positions[start:start + STREAM_BATCH_SIZE])
+        if ndjson:
+            yield b'\n'.join(encoded) + b'\n'
+        else:
+            yield (b', ' if start else b'') + b', '.join(encoded)
+    if not ndjson:
+        yield b']'
+
+def handle_rentals_page(params):
+    """
+    GET /api/rentals with `limit`/`cursor` pagination and optional streaming
+    (`stream=1` for a chunked JSON array, `format=ndjson` for NDJSON).
+    Listings are ordered by their position in the dataset, and the next
+    page's cursor is returned in the X-Next-Cursor header.
+    """
+    index = rental_index
+    city = params.get('city', [None])[0]
+    state = params.get('state', [None])[0]
+    ndjson = params.get('format', [None])[0] == 'ndjson'
+    stream = ndjson or params.get('stream', ['0'])[0].lower() in ('1', 'true')
+
+    limit = params.get('limit', [None])[0]
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return 400, JSON_HEADERS, json.dumps({"error": "limit must be a positive integer"}).encode()
+        if not stream:
+            limit = min(limit, MAX_PAGE_SIZE)
+
+    positions = index.lookup(city, state)
+    cursor = params.get('cursor', [None])[0]
+    if cursor:
+        start_position = decode_cursor(cursor, index.version)
+        if start_position is None:
+            error = {"error": "Invalid or expired cursor; restart from the first page"}
+            return 400, JSON_HEADERS, json.dumps(error).encode()
+        positions = positions[np.searchsorted(positions, start_position):]
+
+    response_headers = [
+        ('Content-Type', 'application/x-ndjson' if ndjson else 'application/json'),
+        ('Access-Control-Allow-Origin', '*'),
+        ('Access-Control-Expose-Headers', 'X-Next-Cursor'),
+    ]
+    if limit is not None and len(positions) > limit:
+        response_headers.append(('X-Next-Cursor', encode_cursor(index.version, positions[limit])))
+        positions = positions[:limit]
+
+    if stream:
+        return 200, response_headers, stream_listings(index, positions, ndjson)
+    return 200, response_headers, encode_rentals(index, positions)
+
+CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+]
+
+def cached_response(entry, headers, conditional=True):
+    """
+    Build a 200 (or 304 when `conditional` and If-None-Match matches) from
+    a cached body, gzipped if the client accepts it.
+    """
+    if conditional and entry.matches(headers.get('if-none-match')):
+        etag = entry.etag_for(headers.get('accept-encoding'))
+        return 304, [('ETag', etag), ('Access-Control-Allow-Origin', '*')], b''
+    body, encoding_headers = entry.encoded(headers.get('accept-encoding'))
+    return 200, JSON_HEADERS + encoding_headers, body
+
+stale_reload_lock = threading.Lock()
+
+def reload_stale_data(stale_index):
+    """Reload the rental data in the background, once per stale index"""
+    def reload():
+        with stale_reload_lock:
+            if rental_index is stale_index:
+                set_rental_index(load_rental_index())
+    threading.Thread(target=reload, name='rental-data-reload', daemon=True).start()
+
+def handle_request(method, path, headers, body):
+    """
+    Route one API request independently of the server backend.
+    `headers` uses lowercased names; returns (status, headers, body) where
+    body is bytes or, for streamed responses, an iterator of bytes chunks.
+    """
+    index = rental_index
+    try:
+        return route_request(method, path, headers, body)
+    except StaleRentalFileError as e:
+        # The JSON file was rewritten under us; reload rather than serve its new bytes
+        print(f"Error reading rental data: {e}")
+        reload_stale_data(index)
+        return 503, JSON_HEADERS + [('Retry-After', '1')], json.dumps({"error": "Rental data is reloading"}).encode()
+
+def route_request(method, path, headers, body):
+    parsed_path = urlparse(path)
+    if method == 'GET' and parsed_path.path == '/api/rentals':
+        params = parse_qs(parsed_path.query)
+        if any(name in params for name in ('limit', 'cursor', 'stream', 'format')):
+            return handle_rentals_page(params)
+        city = params.get('city', [None])[0]
+        state = params.get('state', [None])[0]
+        # City matching is case-insensitive and state is upper-cased, so
+        # queries differing only in case share one cache entry.
+        key = ('rentals', (city or '').lower(), (state or '').upper())
+        index = rental_index
+        entry = response_cache.get(index.version, key)
+        if entry is None:
+            body = encode_rentals(index, index.lookup(city, state))
+            entry = response_cache.put(index.version, key, body)
+        return cached_response(entry, headers)
+
+    if method == 'GET' and parsed_path.path == '/api/rentals/nearby':
+        return handle_nearby_request(parse_qs(parsed_path.query))
+
+    if method == 'POST' and parsed_path.path == '/api/scoring/recommendations/batch':
+        ndjson = 'ndjson' in headers.get('content-type', '')
+        return handle_batch_recommendations_request(body, ndjson)
+
+    if method == 'POST' and parsed_path.path == '/api/scoring/recommendations':
+        data = json.loads(body.decode())
+        key = ('recommendations', json.dumps(data, sort_keys=True))
+        version = rental_index.version
+        entry = response_cache.get(version, key)
+        if entry is None:
             result = handle_recommendations_request(data)
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
+            if isinstance(result, tuple):
+                result, status = result
+                return status, JSON_HEADERS, json.dumps(result).encode()
+            entry = response_cache.put(version, key, json.dumps(result).encode())
+        return cached_response(entry, headers, conditional=False)
+
+    if method == 'OPTIONS':
+        return 200, CORS_HEADERS, b''
+
+    return 404, [], b''
+
+class RentalAPIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so streamed bodies can use chunked transfer encoding; every
+    # response still closes the connection so idle clients can't pin workers.
+    protocol_version = 'HTTP/1.1'
+
+    def _dispatch(self):
+        content_length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(content_length) if content_length else b''
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        status, response_headers, response_body = handle_request(self.command, self.path, headers, body)
+        self.send_response(status)
+        for name, value in response_headers:
+            self.send_header(name, value)
+        self.send_header('Connection', 'close')
+        if isinstance(response_body, bytes):
+            if status != 304:
+                self.send_header('Content-Length', str(len(response_body)))
             self.end_headers()
-            self.wfile.write(json.dumps(result).encode())
+            self.wfile.write(response_body)
             return
-        self.send_response(404)
-        self.end_headers()
-    
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
         self.end_headers()
+        for chunk in response_body:
+            if not chunk:
+                continue
+            if chunked:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            else:
+                self.wfile.write(chunk)
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
 
-def run_server(port=5001):
+    do_GET = _dispatch
+    do_POST = _dispatch
+    do_OPTIONS = _dispatch
+
+SERVER_MODES = ('single', 'threaded', 'asyncio', 'prefork')
+
+def start_data_watcher(interval):
+    if interval > 0:
+        RentalDataWatcher(interval).start()
+
+def run_server(port=5001, mode='threaded', workers=8, processes=None, reload_interval=5.0):
+    """
+    Start the rental API.
+    mode: 'single' (one request at a time), 'threaded' (bounded worker pool),
+    'asyncio' (event loop with HTTP/1.1 keep-alive) or 'prefork' (`processes`
+    forked workers sharing the already-loaded rental data, each with a pool
+    of `workers` threads).
+    Every `reload_interval` seconds (0 disables) the data files are checked
+    and a changed dataset is loaded in the background and swapped in.
+    """
     server_address = ('', port)
-    httpd = HTTPServer(server_address, RentalAPIHandler)
-    print(f'Starting server on port {port}...')
+    print(f'Starting {mode} server on port {port}...')
+    if mode == 'prefork':
+        # The supervisor loads new data once and re-forks the workers, so
+        # they keep sharing its pages instead of each loading a copy
+        watcher = RentalDataWatcher(reload_interval)
+        serve_prefork(RentalAPIHandler, port=port, processes=processes, threads=workers,
+                      poll=watcher.poll if reload_interval > 0 else None, poll_interval=reload_interval)
+        return
+    start_data_watcher(reload_interval)
+    if mode == 'asyncio':
+        asyncio.run(serve_asyncio(handle_request, port=port, workers=workers))
+        return
+    if mode == 'threaded':
+        httpd = PooledHTTPServer(server_address, RentalAPIHandler, workers=workers)
+    else:
+        httpd = HTTPServer(server_address, RentalAPIHandler)
     httpd.serve_forever()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Rental API server')
+    parser.add_argument('--port', type=int, default=int(os.getenv('RENTAL_API_PORT', 5001)))
+    parser.add_argument('--mode', choices=SERVER_MODES, default=os.getenv('RENTAL_API_MODE', 'threaded'))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('RENTAL_API_WORKERS', 8)))
+    parser.add_argument('--processes', type=int, default=int(os.getenv('RENTAL_API_PROCESSES', 0)) or None,
+                        help='prefork worker processes (default: one per CPU)')
+    parser.add_argument('--reload-interval', type=float, default=float(os.getenv('RENTAL_API_RELOAD_INTERVAL', 5)),
+                        help='seconds between checks for new rental data (0 disables)')
+    return parser.parse_args(argv)
+
 if __name__ == '__main__':
-    run_server()
+    args = parse_args()
+    run_server(args.port, args.mode, args.workers, args.processes, args.reload_interval)
@@ -0,0 +1,292 @@
+# http_servers.py
+import asyncio
+import gc
+import os
+import queue
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+from http import HTTPStatus
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer that hands accepted connections to a fixed pool of worker
+    threads. The hand-off queue is bounded, so once every worker is busy and
+    the queue is full the accept loop stops and clients wait in the listen
+    backlog instead of spawning unbounded threads.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers=8, queue_size=None,
+                 bind_and_activate=True):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.pending = queue.Queue(maxsize=queue_size or workers * 4)
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._worker, name=f"http-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def process_request(self, request, client_address):
+        self.pending.put((request, client_address))
+
+    def _worker(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.workers:
+            self.pending.put(None)
+        for worker in self.workers:
+            worker.join()
+
+async def _read_request(reader):
+    """Read one HTTP/1.x request; returns None when the client closed the connection"""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, target, version = request_line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return method, target, version, headers, body
+
+def _keep_alive(version, headers):
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        return connection != 'close'
+    return connection == 'keep-alive'
+
+def _status_line(status):
+    try:
+        phrase = HTTPStatus(status).phrase
+    except ValueError:
+        phrase = ''
+    return f"HTTP/1.1 {status} {phrase}\r\n"
+
+async def _write_stream(writer, chunks, loop, executor, chunked):
+    """Write an iterator of body chunks, producing each one on the executor"""
+    chunks = iter(chunks)
+    while True:
+        chunk = await loop.run_in_executor(executor, next, chunks, None)
+        if chunk is None:
+            break
+        if not chunk:
+            continue
+        if chunked:
+            writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+        else:
+            writer.write(chunk)
+        await writer.drain()
+    if chunked:
+        writer.write(b'0\r\n\r\n')
+
+async def _handle_connection(reader, writer, handle_request, executor):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                break
+            if request is None:
+                break
+            method, target, version, headers, body = request
+
+            # Handlers are plain blocking functions; run them on the pool so
+            # the event loop keeps serving other connections meanwhile.
+            status, response_headers, response_body = await loop.run_in_executor(
+                executor, handle_request, method, target, headers, body)
+
+            keep_alive = _keep_alive(version, headers)
+            streamed = not isinstance(response_body, bytes)
+            if streamed and version != 'HTTP/1.1':
+                # HTTP/1.0 has no chunked encoding; the close delimits the body
+                keep_alive = False
+            head = [_status_line(status)]
+            for name, value in response_headers:
+                head.append(f"{name}: {value}\r\n")
+            if streamed:
+                if keep_alive:
+                    head.append("Transfer-Encoding: chunked\r\n")
+            elif status != 304:
+                head.append(f"Content-Length: {len(response_body)}\r\n")
+            head.append("Connection: keep-alive\r\n" if keep_alive else "Connection: close\r\n")
+            head.append("\r\n")
+            writer.write(''.join(head).encode('latin-1'))
+            if not streamed:
+                writer.write(response_body)
+            else:
+                await _write_stream(writer, response_body, loop, executor, chunked=keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve_asyncio(handle_request, host='', port=5001, workers=8):
+    """
+    Serve `handle_request(method, path, headers, body) -> (status, headers, body)`
+    over asyncio with HTTP/1.1 keep-alive. A body that isn't bytes is treated
+    as an iterator of chunks and sent with chunked transfer encoding.
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def on_connection(reader, writer):
+        await _handle_connection(reader, writer, handle_request, executor)
+
+    server = await asyncio.start_server(on_connection, host or None, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=False)
+
+def _listen_socket(port, reuse_port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('', port))
+    sock.listen(PooledHTTPServer.request_queue_size)
+    return sock
+
+def _run_worker(handler_class, threads, sock):
+    """
+    Body of a forked worker: serve on a listening socket inherited from the
+    supervisor. SIGHUP retires the worker: it stops accepting, finishes the
+    requests it already has, and exits. The supervisor keeps the socket
+    open, so connections still queued on it wait for the next worker.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    httpd = PooledHTTPServer(sock.getsockname(), handler_class, workers=threads,
+                             bind_and_activate=False)
+    httpd.socket.close()
+    httpd.socket = sock
+    httpd.server_name, httpd.server_port = sock.getsockname()[:2]
+    # shutdown() waits for serve_forever, so it can't run in the handler itself
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=httpd.shutdown).start())
+    httpd.serve_forever()
+    httpd.server_close()
+
+def serve_prefork(handler_class, port=5001, processes=None, threads=4, on_worker_start=None,
+                  poll=None, poll_interval=5.0):
+    """
+    Pre-fork server: whatever the parent loaded before calling this (the
+    rental data and its indexes) is inherited copy-on-write by every worker.
+    Each worker runs a PooledHTTPServer. The parent opens the listening
+    sockets and every worker inherits one: with SO_REUSEPORT there is one
+    socket per worker slot on the same port and the kernel spreads
+    connections, otherwise all workers accept on one socket. The parent only
+    supervises, restarting workers that die; a restarted or replacement
+    worker takes over its slot's socket and the connections queued on it. `on_worker_start` runs in each
+    worker right after the fork.
+
+    `poll`, if given, runs in the parent every `poll_interval` seconds. When
+    it returns True (it loaded new data), every worker is replaced by a
+    fresh fork, so the new data is loaded once and shared again; each new
+    worker starts before the one it replaces retires.
+    """
+    processes = processes or os.cpu_count() or 1
+    if hasattr(socket, 'SO_REUSEPORT'):
+        sockets = [_listen_socket(port, reuse_port=True) for _ in range(processes)]
+    else:
+        sockets = [_listen_socket(port, reuse_port=False)] * processes
+
+    # Move everything allocated so far out of the cyclic GC's reach so that
+    # collections in the workers don't write to (and un-share) those pages.
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    retiring = set()
+    stopping = False
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                if on_worker_start:
+                    on_worker_start()
+                _run_worker(handler_class, threads, sockets[slot])
+            except KeyboardInterrupt:
+                pass
+            except Exception as e:
+                print(f"Worker {os.getpid()} crashed: {e}")
+                status = 1
+            finally:
+                os._exit(status)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children) + list(retiring):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for slot in range(processes):
+        spawn(slot)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Supervising {processes} workers on port {port}")
+
+    def replace_workers():
+        gc.collect()
+        gc.freeze()
+        for pid, slot in list(children.items()):
+            del children[pid]
+            spawn(slot)
+            retiring.add(pid)
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+        print(f"Replaced {processes} workers with ones sharing the new data")
+
+    next_poll = time.monotonic() + poll_interval
+    while children:
+        if poll is not None and not stopping and time.monotonic() >= next_poll:
+            if poll():
+                replace_workers()
+            next_poll = time.monotonic() + poll_interval
+        try:
+            pid, status = os.waitpid(-1, 0 if poll is None else os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        retiring.discard(pid)
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        print(f"Worker {pid} exited (status {status}); restarting")
+        time.sleep(0.5)  # avoid a tight restart loop if workers keep dying
+        spawn(slot)
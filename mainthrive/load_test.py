@@ -0,0 +1,104 @@
+# load_test.py
+"""
+Load test for the rental API server modes.
+
+Starts app.py in each serving mode on a local port, drives it with an
+increasing number of concurrent clients and prints requests/second.
+
+    python load_test.py --modes single threaded asyncio prefork --clients 1 4 16 64
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+RECOMMENDATION_REQUEST = {
+    "city": "San Francisco",
+    "state": "CA",
+    "income": 90000,
+    "savings": 20000,
+    "household_size": 2,
+    "housing_budget_percentage": "30-40",
+}
+
+def wait_for_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def run_client(port, duration, counts, errors):
+    """Alternate GET /api/rentals and POST recommendations until time runs out"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    body = json.dumps(RECOMMENDATION_REQUEST)
+    deadline = time.time() + duration
+    done = 0
+    while time.time() < deadline:
+        try:
+            if done % 2:
+                conn.request('POST', '/api/scoring/recommendations', body=body,
+                             headers={'Content-Type': 'application/json'})
+            else:
+                conn.request('GET', '/api/rentals?city=San%20Francisco&state=CA')
+            response = conn.getresponse()
+            response.read()
+            done += 1
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.close()
+    counts.append(done)
+
+def measure(port, clients, duration):
+    counts = []
+    errors = []
+    threads = [threading.Thread(target=run_client, args=(port, duration, counts, errors))
+               for _ in range(clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    return sum(counts) / elapsed, len(errors)
+
+def main():
+    parser = argparse.ArgumentParser(description='Rental API load test')
+    parser.add_argument('--modes', nargs='+', default=['single', 'threaded', 'asyncio', 'prefork'])
+    parser.add_argument('--clients', nargs='+', type=int, default=[1, 4, 16, 64])
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--port', type=int, default=5051)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'clients':>8} {'req/s':>10} {'errors':>8}")
+    for mode in args.modes:
+        server = subprocess.Popen(
+            [sys.executable, APP_PATH, '--mode', mode, '--port', str(args.port),
+             '--workers', str(args.workers)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_port(args.port):
+                print(f"{mode}: server did not start")
+                continue
+            for clients in args.clients:
+                throughput, errors = measure(args.port, clients, args.duration)
+                print(f"{mode:<10} {clients:>8} {throughput:>10.1f} {errors:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -1,47 +1,249 @@
 import json
 import os
+import re
+import sys
+from collections import Counter
+from rental_snapshot import SnapshotWriter
 
-def load_zillow_data():
+SNAPSHOT_PATH = 'zillow_rentals.snapshot'
+
+REQUIRED_FIELDS = ['zpid', 'id', 'address', 'addressCity', 'addressState', 'units']
+ADDRESS_FIELDS = ['address', 'addressStreet', 'addressCity', 'addressZipcode']
+
+# Characters read from the input per chunk while streaming
+READ_CHUNK_SIZE = 1024 * 1024
+
+WHITESPACE = re.compile(r'\s+')
+
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE, with_text=False, on_malformed=None):
+    """
+    Yield the elements of a top-level JSON array one at a time, reading the
+    file in chunks so memory stays bounded by the largest single element.
+    With `with_text`, yield (element, offset, source text) instead, where
+    offset counts characters from the start of the file.
+
+    Elements that are not valid JSON are skipped up to the next top-level
+    ',' or ']', and on_malformed(offset) is called for each one.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    consumed = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, consumed, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        consumed += pos
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def element_end(start):
+        """Index of the ',' or ']' that ends the element at `start`, or None if the buffer ends first"""
+        depth = 0
+        in_string = False
+        escaped = False
+        for i in range(start, len(buffer)):
+            c = buffer[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif c == '\\':
+                    escaped = True
+                elif c == '"':
+                    in_string = False
+            elif c == '"':
+                in_string = True
+            elif c in '[{':
+                depth += 1
+            elif depth == 0 and c in ',]':
+                return i
+            elif c in ']}':
+                depth = max(depth - 1, 0)
+        return None
+
+    skip_whitespace()
+    if buffer[pos:pos + 1] != '[':
+        raise ValueError("Data is not in the expected format (should be a list)")
+    pos += 1
+
+    first = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of file inside the listings array")
+        if buffer[pos] == ']':
+            return
+        if not first:
+            if buffer[pos] != ',':
+                raise ValueError(f"Expected ',' between listings, found {buffer[pos]!r}")
+            pos += 1
+            skip_whitespace()
+        first = False
+
+        malformed = False
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # Only an element cut off at the end of the buffer needs more input
+                if not eof and (e.pos >= len(buffer) - 1 or element_end(pos) is None):
+                    fill()
+                    continue
+                malformed = True
+                end = element_end(pos)
+                if end is None:
+                    end = len(buffer)
+                break
+            # A number can be cut off at the chunk boundary and still decode
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            break
+        if malformed:
+            if on_malformed is not None:
+                on_malformed(consumed + pos)
+        elif with_text:
+            yield element, consumed + pos, buffer[pos:end]
+        else:
+            yield element
+        pos = end
+
+def normalize_text(value):
+    """Trim and collapse whitespace in a string field"""
+    if not isinstance(value, str):
+        return value
+    return WHITESPACE.sub(' ', value).strip()
+
+def normalize_price(price):
+    """Render numeric prices like the scraped strings ("$2,750"); tidy strings"""
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return f"${price:,.0f}"
+    return normalize_text(price)
+
+def validate_listing(listing):
+    """
+    Normalize a listing in place. Returns None if it is valid, otherwise the
+    reason it should be rejected.
+    """
+    if not isinstance(listing, dict):
+        return 'not_an_object'
+    if any(field not in listing for field in REQUIRED_FIELDS):
+        return 'missing_fields'
+    if listing['zpid'] in (None, ''):
+        return 'missing_zpid'
+
+    for field in ADDRESS_FIELDS:
+        if field in listing:
+            listing[field] = normalize_text(listing[field])
+    if isinstance(listing.get('addressZipcode'), int):
+        listing['addressZipcode'] = str(listing['addressZipcode'])
+    if not isinstance(listing['addressCity'], str) or not listing['addressCity']:
+        return 'invalid_city'
+    state = listing['addressState']
+    if not isinstance(state, str) or not state.strip():
+        return 'invalid_state'
+    listing['addressState'] = state.strip().upper()
+
+    units = listing['units']
+    if not isinstance(units, list) or not all(isinstance(unit, dict) for unit in units):
+        return 'invalid_units'
+    for unit in units:
+        if 'price' in unit:
+            unit['price'] = normalize_price(unit['price'])
+
+    lat_long = listing.get('latLong')
+    if lat_long is not None and not isinstance(lat_long, dict):
+        return 'invalid_coordinates'
+    return None
+
+def load_zillow_data(input_path='zillow_rentals.json', output_path=None, batch_size=1000):
     """
     Load Zillow rental data from JSON file and save it to a format
-    that can be used by the Flask application.
+    that can be used by the Flask application: the cleaned JSON plus the
+    binary snapshot app.py memory-maps at startup.
+
+    The input is streamed: every listing is validated and normalized,
+    duplicates (by zpid) and invalid listings are rejected and counted, and
+    accepted listings are written out in batches. The output replaces
+    `output_path` (default: the input file) only once it is complete.
     """
+    output_path = output_path or input_path
+    snapshot = None
     try:
         # Check if the file exists
-        if not os.path.exists('zillow_rentals.json'):
-            print("Error: zillow_rentals.json file not found")
-            return False
-        
-        # Load the data
-        with open('zillow_rentals.json', 'r') as f:
-            data = json.load(f)
-        
-        print(f"Successfully loaded {len(data)} rental listings")
-        
-        # Basic validation
-        if not isinstance(data, list):
-            print("Error: Data is not in the expected format (should be a list)")
+        if not os.path.exists(input_path):
+            print(f"Error: {input_path} file not found")
             return False
-        
-        # Check a sample entry
-        if len(data) > 0:
-            sample = data[0]
-            required_fields = ['zpid', 'id', 'address', 'addressCity', 'addressState', 'units']
-            missing_fields = [field for field in required_fields if field not in sample]
-            
-            if missing_fields:
-                print(f"Warning: Sample entry is missing required fields: {', '.join(missing_fields)}")
-        
-        # Save the data back (this step is optional but ensures the file is properly formatted)
-        with open('zillow_rentals.json', 'w') as f:
-            json.dump(data, f)
-        
+
+        seen_zpids = set()
+        rejected = Counter()
+        accepted = 0
+        snapshot = SnapshotWriter(SNAPSHOT_PATH)
+        tmp_path = output_path + '.tmp'
+
+        with open(input_path, 'r') as f, open(tmp_path, 'w') as out:
+            out.write('[')
+            batch = []
+            def count_malformed(offset):
+                rejected['malformed_json'] += 1
+
+            for listing in iter_json_array(f, on_malformed=count_malformed):
+                reason = validate_listing(listing)
+                if reason is None:
+                    zpid = str(listing['zpid'])
+                    if zpid in seen_zpids:
+                        reason = 'duplicate_zpid'
+                    else:
+                        seen_zpids.add(zpid)
+                if reason is not None:
+                    rejected[reason] += 1
+                    continue
+
+                snapshot.add(listing)
+                batch.append(json.dumps(listing))
+                accepted += 1
+                if len(batch) >= batch_size:
+                    out.write((', ' if accepted > len(batch) else '') + ', '.join(batch))
+                    batch = []
+            if batch:
+                out.write((', ' if accepted > len(batch) else '') + ', '.join(batch))
+            out.write(']')
+
+        # The JSON goes in place first so the snapshot ends up the newer file
+        os.replace(tmp_path, output_path)
+        snapshot.close()
+
+        print(f"Successfully loaded {accepted} rental listings")
+        if rejected:
+            print(f"Rejected {sum(rejected.values())} listings:")
+            for reason, count in rejected.most_common():
+                print(f"  {reason}: {count}")
+        if snapshot.builder.unparsed_prices:
+            print(f"Warning: {snapshot.builder.unparsed_prices} units have no parseable price")
+        print(f"Wrote {accepted} listings to {output_path} and {SNAPSHOT_PATH}")
+
         print("Data processing complete")
         return True
-        
+
     except Exception as e:
         print(f"Error processing Zillow data: {str(e)}")
+        if os.path.exists(output_path + '.tmp'):
+            os.remove(output_path + '.tmp')
+        if snapshot is not None:
+            snapshot.discard()
         return False
 
 if __name__ == "__main__":
-    load_zillow_data()
\ No newline at end of file
+    load_zillow_data(*sys.argv[1:3])
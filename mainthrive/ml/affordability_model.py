@@ -4,14 +4,15 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 import joblib
 import os
-from config import AFFORDABILITY_WEIGHTS, AFFORDABILITY_MODEL_PATH, AFFORDABILITY_THRESHOLDS
-from data_utils import fetch_locations_data, preprocess_location_data
+from config import AFFORDABILITY_WEIGHTS, AFFORDABILITY_MODEL_PATH, AFFORDABILITY_THRESHOLDS, PREPROCESSOR_PATH
+from data_utils import fetch_locations_data, LocationPreprocessor
 
 class AffordabilityModel:
     """Model for calculating and predicting affordability scores"""
     
     def __init__(self):
         self.model = None
+        self.preprocessor = None
         self.weights = AFFORDABILITY_WEIGHTS
         self.thresholds = AFFORDABILITY_THRESHOLDS
     
@@ -57,8 +58,9 @@ class AffordabilityModel:
             print("Insufficient data for training. Using rule-based scoring instead.")
             return False
         
-        # Preprocess data
-        processed_df = preprocess_location_data(locations_df)
+        # Fit preprocessing once; predictions reuse it as-is
+        self.preprocessor = LocationPreprocessor().fit(locations_df)
+        processed_df = self.preprocessor.transform(locations_df)
         
         # Calculate target affordability scores using rule-based approach
         target_scores = self.calculate_affordability_score(locations_df)
@@ -86,28 +88,35 @@ class AffordabilityModel:
         # Save model
         os.makedirs(os.path.dirname(AFFORDABILITY_MODEL_PATH), exist_ok=True)
         joblib.dump(self.model, AFFORDABILITY_MODEL_PATH)
+        self.preprocessor.save(PREPROCESSOR_PATH)
         
         return True
     
     def load(self):
-        """Load trained model from disk"""
+        """Load trained model and its fitted preprocessing from disk"""
         try:
             self.model = joblib.load(AFFORDABILITY_MODEL_PATH)
+            self.preprocessor = LocationPreprocessor.load(PREPROCESSOR_PATH)
             return True
         except:
-            print(f"No trained model found at {AFFORDABILITY_MODEL_PATH}")
+            # Models trained before the preprocessor was saved need retraining
+            self.model = None
+            self.preprocessor = None
+            print(f"No trained model found at {AFFORDABILITY_MODEL_PATH} (or {PREPROCESSOR_PATH})")
             return False
     
     def predict(self, location_data):
         """Predict affordability score for new locations"""
         # If model is trained, use it for prediction
         if self.model is not None:
-            # Preprocess the data
-            processed_data = preprocess_location_data(location_data)
+            if isinstance(location_data, dict):
+                location_data = pd.DataFrame([location_data])
+
+            # Transform with the preprocessing fitted at training time
+            processed_data = self.preprocessor.transform(location_data)
             
-            # Select features for prediction
-            features = [col for col in processed_data.columns if col not in 
-                       ['id', 'city', 'affordability_score', 'created_at', 'updated_at']]
+            # Select the features the model was trained on
+            features = list(self.model.feature_names_in_)
             
             # Make prediction
             predictions = self.model.predict(processed_data[features])
@@ -0,0 +1,152 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import BATCH_TOP_K, BATCH_USER_BLOCK_SIZE, BATCH_LOCATION_BLOCK_SIZE
+from data_utils import fetch_locations_data, fetch_user_profiles, save_predictions_to_db
+from recommendation_model import RecommendationModel
+
+# Location columns the match rules and the cluster model read; updated_at
+# tells the cluster index which locations need relabelling
+LOCATION_COLUMNS = [
+    'id', 'affordability_score', 'cost_housing', 'safety_score', 'education_score',
+    'healthcare_score', 'walkability_score', 'public_transit_score', 'traffic_score',
+    'updated_at'
+]
+
+def top_k_keys(model, locations, positions, users, top_k, location_block_size):
+    """
+    The best `top_k` matches for each encoded user among the locations at
+    `positions`, scoring one block of locations at a time. Each match is
+    packed into one integer, score * n + (n - 1 - position) for n
+    locations, so that ties go to the earlier location. Returns the keys
+    best first, one row per user.
+    """
+    n = len(locations['cost_housing'])
+    best = np.empty((len(users['transport']), 0), dtype=np.int64)
+    for start in range(0, len(positions), location_block_size):
+        block = positions[start:start + location_block_size]
+        block_locations = {name: values[..., block] for name, values in locations.items()}
+        keys = model.match_score_matrix(block_locations, users) * n + (n - 1 - block)
+        best = np.concatenate([best, keys], axis=1)
+        if best.shape[1] > top_k:
+            best = np.take_along_axis(best, np.argpartition(best, -top_k, axis=1)[:, -top_k:], axis=1)
+    return -np.sort(-best, axis=1)
+
+def decode_keys(keys, n):
+    """Location positions and match scores packed by top_k_keys"""
+    return n - 1 - keys % n, keys // n
+
+# Per-process state for scoring blocks, set by _init_scoring
+_scoring = {}
+
+def _init_scoring(locations, partitions, top_k, location_block_size):
+    _scoring.update(model=RecommendationModel(), locations=locations, partitions=partitions,
+                    top_k=top_k, location_block_size=location_block_size)
+
+def _score_block(task):
+    partition, users = task
+    return top_k_keys(_scoring['model'], _scoring['locations'], _scoring['partitions'][partition],
+                      users, _scoring['top_k'], _scoring['location_block_size'])
+
+def run_batch(user_ids=None, top_k=BATCH_TOP_K, user_block_size=BATCH_USER_BLOCK_SIZE,
+              location_block_size=BATCH_LOCATION_BLOCK_SIZE, workers=1):
+    """
+    Recompute and save the top `top_k` recommendations of every user, or of
+    `user_ids`, replacing whatever was stored for them before. Users are scored in blocks against the locations of their
+    preferred cluster (all locations without a trained model), in up to
+    `workers` processes. Returns the number of recommendations written,
+    or None on error.
+    """
+    if top_k < 1:
+        print("top_k must be at least 1.")
+        return None
+
+    started = time.perf_counter()
+    profiles_df = fetch_user_profiles(user_ids)
+    if profiles_df is None or len(profiles_df) == 0:
+        print("No user profiles to score.")
+        return None
+    profiles_df['income'] = profiles_df['income'].astype(float)
+
+    locations_df = fetch_locations_data(columns=LOCATION_COLUMNS)
+    if locations_df is None or len(locations_df) == 0:
+        print("No location data available.")
+        return None
+
+    model = RecommendationModel()
+    if model.load() and model.kmeans is not None:
+        location_partitions = model.cluster_partitions(locations_df)
+        user_partitions = model.preferred_clusters(profiles_df)
+        partitions = {cluster: location_partitions.get(int(cluster), np.empty(0, dtype=np.intp))
+                      for cluster in np.unique(user_partitions)}
+    else:
+        print("No trained model found. Using rule-based recommendations.")
+        user_partitions = np.zeros(len(profiles_df), dtype=np.intp)
+        partitions = {0: np.arange(len(locations_df))}
+
+    locations = model.encode_locations(locations_df)
+    users = model.encode_user_profiles(profiles_df)
+    user_id_values = profiles_df['user_id'].to_numpy()
+    location_ids = locations_df['id'].to_numpy()
+    affordability_scores = locations_df['affordability_score'].to_numpy()
+
+    # One task per block of users that share a partition
+    tasks = []
+    task_user_ids = []
+    for partition in partitions:
+        rows = np.flatnonzero(user_partitions == partition)
+        for start in range(0, len(rows), user_block_size):
+            block = rows[start:start + user_block_size]
+            tasks.append((partition, {name: values[block] for name, values in users.items()}))
+            task_user_ids.append(user_id_values[block])
+
+    scoring_args = (locations, partitions, top_k, location_block_size)
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_scoring, initargs=scoring_args)
+        results = executor.map(_score_block, tasks)
+    else:
+        _init_scoring(*scoring_args)
+        results = map(_score_block, tasks)
+
+    written = 0
+    try:
+        # Blocks are written as they finish, while the pool scores the rest
+        for block_user_ids, keys in zip(task_user_ids, results):
+            positions, match_scores = decode_keys(keys, len(location_ids))
+            saved = save_predictions_to_db(zip(
+                np.repeat(block_user_ids, keys.shape[1]).tolist(),
+                location_ids[positions].ravel().tolist(),
+                affordability_scores[positions].ravel().tolist(),
+                match_scores.ravel().tolist()
+            ), replace_users=block_user_ids.tolist())
+            if not saved:
+                return None
+            written += keys.size
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    print(f"Wrote {written} recommendations for {len(profiles_df)} users against "
+          f"{len(location_ids)} locations in {time.perf_counter() - started:.1f}s")
+    return written
+
+def main():
+    """Recompute the top recommendations of every user (or of --user-ids) in one run"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--user-ids', help='comma-separated user ids; default all users')
+    parser.add_argument('--top-k', type=int, default=BATCH_TOP_K, help='recommendations kept per user')
+    parser.add_argument('--user-block-size', type=int, default=BATCH_USER_BLOCK_SIZE)
+    parser.add_argument('--location-block-size', type=int, default=BATCH_LOCATION_BLOCK_SIZE)
+    parser.add_argument('--workers', type=int, default=1, help='processes scoring user blocks')
+    args = parser.parse_args()
+
+    user_ids = None
+    if args.user_ids:
+        user_ids = [int(user_id) for user_id in args.user_ids.split(',')]
+    if run_batch(user_ids, args.top_k, args.user_block_size, args.location_block_size, args.workers) is None:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
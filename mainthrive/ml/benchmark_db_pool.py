@@ -0,0 +1,65 @@
+import argparse
+import threading
+import time
+import numpy as np
+from data_utils import connect_to_db, db_connection, get_db_pool, close_db_pool
+
+QUERY = "SELECT 1"
+
+def unpooled_call():
+    """What every data_utils call used to do: connect, query, disconnect"""
+    conn = connect_to_db()
+    if conn is None:
+        raise RuntimeError("Could not connect to the database")
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(QUERY)
+            cursor.fetchall()
+    finally:
+        conn.close()
+
+def pooled_call():
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(QUERY)
+            cursor.fetchall()
+
+def run(call, calls, threads):
+    """Run `calls` calls spread over `threads` threads; returns per-call latencies in ms"""
+    latencies = [[] for _ in range(threads)]
+
+    def worker(results, count):
+        for _ in range(count):
+            started = time.perf_counter()
+            call()
+            results.append((time.perf_counter() - started) * 1000)
+
+    workers = [threading.Thread(target=worker, args=(latencies[i], calls // threads))
+               for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return np.concatenate([np.array(results) for results in latencies]), elapsed
+
+def report(name, latencies, elapsed):
+    print(f"{name:>9}: mean {latencies.mean():7.3f} ms  p50 {np.percentile(latencies, 50):7.3f} ms  "
+          f"p95 {np.percentile(latencies, 95):7.3f} ms  {len(latencies) / elapsed:8.0f} calls/s")
+
+def main():
+    """Compare per-call latency with and without the data_utils connection pool"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.calls} calls of {QUERY!r} over {args.threads} thread(s)")
+    report('unpooled', *run(unpooled_call, args.calls, args.threads))
+    get_db_pool()
+    report('pooled', *run(pooled_call, args.calls, args.threads))
+    close_db_pool()
+
+if __name__ == "__main__":
+    main()
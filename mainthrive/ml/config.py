@@ -13,10 +13,36 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'thrive')
 }
 
+# Where the ML scripts read and write data: 'postgres' (DB_CONFIG) or
+# 'sqlite' for a local database file at SQLITE_DB_PATH
+DATA_SOURCE = os.getenv('ML_DATA_SOURCE', 'postgres')
+SQLITE_DB_PATH = os.getenv('SQLITE_DB_PATH', os.path.join(os.path.dirname(__file__), 'data', 'thrive.sqlite3'))
+
+# Connection pool shared by the data_utils functions
+DB_POOL_CONFIG = {
+    'min_connections': int(os.getenv('DB_POOL_MIN', '1')),
+    'max_connections': int(os.getenv('DB_POOL_MAX', '10')),
+    # Seconds a connection can sit idle before it is checked with SELECT 1
+    'health_check_interval': float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30')),
+    # Seconds to wait for a free connection when the pool is exhausted
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '30'))
+}
+
 # Model paths
 MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
 AFFORDABILITY_MODEL_PATH = os.path.join(MODEL_DIR, 'affordability_model.joblib')
 RECOMMENDATION_MODEL_PATH = os.path.join(MODEL_DIR, 'recommendation_model.joblib')
+# Each location's k-means cluster, saved with the recommendation model
+CLUSTER_INDEX_PATH = os.path.join(MODEL_DIR, 'location_clusters.joblib')
+# Imputation, scaling and encoding fitted alongside the affordability model
+PREPROCESSOR_PATH = os.path.join(MODEL_DIR, 'location_preprocessor.joblib')
+
+# Local copy of the locations table, refreshed incrementally from updated_at
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'cache')
+LOCATIONS_CACHE_PATH = os.getenv('LOCATIONS_CACHE_PATH', os.path.join(CACHE_DIR, 'locations.pkl'))
+# Each sync starts from the database's clock at the previous sync minus this
+# many seconds, so rows stamped earlier but committed after it are still seen
+LOCATIONS_SYNC_OVERLAP_SECONDS = float(os.getenv('LOCATIONS_SYNC_OVERLAP_SECONDS', '300'))
 
 # Feature weights for affordability score calculation
 AFFORDABILITY_WEIGHTS = {
@@ -47,6 +73,56 @@ AFFORDABILITY_THRESHOLDS = {
     'poor': 20
 }
 
+# Compact dtypes for location columns fetched into DataFrames. Columns not
+# listed here get one from their PostgreSQL type (see data_utils).
+LOCATION_DTYPES = {
+    'id': 'int32',
+    'city': 'category',
+    'state': 'category',
+    'country': 'category',
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'affordability_score': 'int16',
+    'cost_housing': 'float32',
+    'cost_food': 'float32',
+    'cost_transportation': 'float32',
+    'cost_healthcare': 'float32',
+    'cost_utilities': 'float32',
+    'safety_score': 'int16',
+    'education_score': 'int16',
+    'healthcare_score': 'int16',
+    'environment_score': 'int16',
+    'unemployment_rate': 'float32',
+    'median_income': 'float32',
+    'job_growth_rate': 'float32',
+    'walkability_score': 'int16',
+    'public_transit_score': 'int16',
+    'traffic_score': 'int16',
+    'bike_score': 'int16',
+    'review_count': 'int32',
+    'overall_rating': 'float32',
+    'affordability_rating': 'float32',
+    'safety_rating': 'float32',
+    'transportation_rating': 'float32',
+    'amenities_rating': 'float32',
+    'created_at': 'datetime64[ns]',
+    'updated_at': 'datetime64[ns]'
+}
+
+# Rows per chunk when streaming locations through a server-side cursor
+LOCATION_FETCH_CHUNK_SIZE = int(os.getenv('LOCATION_FETCH_CHUNK_SIZE', '50000'))
+
+# All-users recommendation job (batch_recommendations.py): matches kept per
+# user, and the users x locations block scored at a time
+BATCH_TOP_K = int(os.getenv('BATCH_TOP_K', '100'))
+BATCH_USER_BLOCK_SIZE = int(os.getenv('BATCH_USER_BLOCK_SIZE', '256'))
+BATCH_LOCATION_BLOCK_SIZE = int(os.getenv('BATCH_LOCATION_BLOCK_SIZE', '8192'))
+
+# Threads answering requests in a `predict.py serve` worker
+PREDICT_WORKER_THREADS = int(os.getenv('PREDICT_WORKER_THREADS', '4'))
+# Records scored together by `predict.py batch`
+PREDICT_BATCH_CHUNK_SIZE = int(os.getenv('PREDICT_BATCH_CHUNK_SIZE', '10000'))
+
 # Data preprocessing parameters
 SCALING_FEATURES = [
     'cost_housing', 'cost_food', 'cost_transportation', 
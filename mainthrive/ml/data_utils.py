@@ -1,114 +1,475 @@
 import os
+import pickle
+import threading
+from contextlib import contextmanager
 import pandas as pd
+from pandas.api.types import union_categoricals
 import numpy as np
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 import joblib
-from config import DB_CONFIG, SCALING_FEATURES, CATEGORICAL_FEATURES, MODEL_DIR
+from config import (DB_CONFIG, DB_POOL_CONFIG, SCALING_FEATURES, CATEGORICAL_FEATURES, MODEL_DIR,
+                    LOCATIONS_CACHE_PATH, LOCATIONS_SYNC_OVERLAP_SECONDS, LOCATION_DTYPES,
+                    LOCATION_FETCH_CHUNK_SIZE, PREPROCESSOR_PATH, DATA_SOURCE, SQLITE_DB_PATH)
+from db_pool import ConnectionPool
 
 # Ensure model directory exists
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+def open_connection():
+    """Open a new PostgreSQL connection, raising on failure"""
+    return psycopg2.connect(
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        host=DB_CONFIG['host'],
+        port=DB_CONFIG['port'],
+        database=DB_CONFIG['database']
+    )
+
 def connect_to_db():
     """Establish connection to PostgreSQL database"""
     try:
-        conn = psycopg2.connect(
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            host=DB_CONFIG['host'],
-            port=DB_CONFIG['port'],
-            database=DB_CONFIG['database']
-        )
-        return conn
+        return open_connection()
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
 
-def fetch_locations_data():
-    """Fetch location data from database"""
-    conn = connect_to_db()
-    if not conn:
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    """The connection pool shared by every function in this module, created on first use"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None or _db_pool.closed:
+            _db_pool = ConnectionPool(open_connection, **DB_POOL_CONFIG)
+        return _db_pool
+
+def close_db_pool():
+    """Close the shared pool's connections"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is not None:
+            _db_pool.closeall()
+            _db_pool = None
+
+@contextmanager
+def db_connection():
+    """
+    Borrow a pooled connection for a `with` block. Any open transaction is
+    rolled back when it is returned, so writers must commit.
+    """
+    with get_db_pool().connection() as conn:
+        yield conn
+
+# dtype for location columns missing from LOCATION_DTYPES, by PostgreSQL type
+POSTGRES_DTYPES = {
+    'smallint': 'int16',
+    'integer': 'int32',
+    'bigint': 'int64',
+    'numeric': 'float32',
+    'real': 'float32',
+    'double precision': 'float64',
+    'boolean': 'bool',
+    'timestamp without time zone': 'datetime64[ns]',
+    'date': 'datetime64[ns]',
+    'character varying': 'category',
+    'text': 'category',
+}
+
+def _location_dtype(name, data_type):
+    return LOCATION_DTYPES.get(name) or POSTGRES_DTYPES.get(data_type, 'object')
+
+def _select_columns(schema):
+    """
+    SELECT list for (name, data_type) columns. Numeric columns are cast to
+    float8 so psycopg2 hands back floats instead of building Decimals.
+    """
+    columns = []
+    for name, data_type in schema:
+        column = sql.Identifier(name)
+        if data_type == 'numeric':
+            column = sql.SQL("{}::float8 AS {}").format(column, column)
+        columns.append(column)
+    return sql.SQL(", ").join(columns)
+
+def typed_location_frame(rows, schema):
+    """DataFrame for a chunk of rows with each column in its compact dtype"""
+    frame = pd.DataFrame.from_records(rows, columns=[name for name, _ in schema], coerce_float=True)
+    for name, data_type in schema:
+        dtype = _location_dtype(name, data_type)
+        if dtype.startswith('int') and frame[name].isna().any():
+            # NULLs in an integer column: keep them as NaN
+            dtype = 'float32'
+        frame[name] = frame[name].astype(dtype)
+    return frame
+
+def concat_location_frames(frames):
+    """Concatenate typed frames, merging categories instead of falling back to object"""
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    categorical = {}
+    for name in frames[0].columns:
+        if all(isinstance(frame[name].dtype, pd.CategoricalDtype) for frame in frames):
+            categorical[name] = union_categoricals([frame[name] for frame in frames])
+    data = pd.concat([frame.drop(columns=list(categorical)) for frame in frames], ignore_index=True)
+    for name, values in categorical.items():
+        data[name] = values
+    return data[frames[0].columns]
+
+def fetch_location_frame(conn, schema, where=sql.SQL(""), params=(), chunk_size=LOCATION_FETCH_CHUNK_SIZE):
+    """
+    Stream locations through a server-side cursor, `chunk_size` rows at a
+    time, converting each chunk to compact dtypes before the next arrives.
+    Only the (name, data_type) columns in `schema` are selected.
+    """
+    query = sql.SQL("SELECT {} FROM locations {}").format(_select_columns(schema), where)
+    frames = []
+    with conn.cursor(name='fetch_locations') as cursor:
+        cursor.itersize = chunk_size
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            frames.append(typed_location_frame(rows, schema))
+    if not frames:
+        frames.append(typed_location_frame([], schema))
+    return concat_location_frames(frames)
+
+# In-process copy of the locations cache: {'schema', 'dtypes', 'synced_at', 'data'}
+_locations_cache = None
+_locations_cache_lock = threading.Lock()
+
+def _locations_schema(cursor):
+    """Column names and types of the locations table, to detect schema changes"""
+    cursor.execute("""
+    SELECT column_name, data_type FROM information_schema.columns
+    WHERE table_name = 'locations' AND table_schema = current_schema()
+    ORDER BY ordinal_position
+    """)
+    return [tuple(row) for row in cursor.fetchall()]
+
+def _load_locations_cache():
+    """Read the cache persisted by an earlier process, if any"""
+    if not os.path.exists(LOCATIONS_CACHE_PATH):
         return None
-    
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        query = """
-        SELECT * FROM locations
+        with open(LOCATIONS_CACHE_PATH, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable locations cache: {e}")
+        return None
+
+def _save_locations_cache(cache):
+    os.makedirs(os.path.dirname(LOCATIONS_CACHE_PATH), exist_ok=True)
+    tmp_path = f"{LOCATIONS_CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, LOCATIONS_CACHE_PATH)
+
+def _locations_cache_entry(schema, data, synced_at):
+    """Cache contents; rows updated after synced_at are re-fetched on the next sync"""
+    return {'schema': schema, 'dtypes': LOCATION_DTYPES,
+            'synced_at': synced_at if 'updated_at' in data.columns else None,
+            'data': data}
+
+def _sync_watermark(conn):
+    """
+    The database's clock, less LOCATIONS_SYNC_OVERLAP_SECONDS. A row stamped
+    by a transaction that started before a sync but committed after it has
+    an updated_at before that sync, so the next one must look back further
+    than the sync itself; rows fetched twice just replace their cached copy.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT LOCALTIMESTAMP - make_interval(secs => %s)", (LOCATIONS_SYNC_OVERLAP_SECONDS,))
+        return cursor.fetchone()[0]
+
+def _refresh_locations(conn, cache):
+    """
+    Bring a cache up to date and return (cache, changed). Rows updated after
+    the last sync's watermark are re-fetched and replace their cached copies
+    by id; if the row count then disagrees with the table, ids are compared
+    to drop deleted rows and fetch any that were missed. A changed schema, or no
+    cache at all, means a full reload.
+    """
+    with conn.cursor() as cursor:
+        schema = _locations_schema(cursor)
+    # Taken before reading, so whatever commits during this sync is read next time
+    synced_at = _sync_watermark(conn)
+    if cache is None or cache['schema'] != schema or cache.get('dtypes') != LOCATION_DTYPES:
+        data = fetch_location_frame(conn, schema, sql.SQL("ORDER BY id"))
+        return _locations_cache_entry(schema, data, synced_at), True
+
+    data = cache['data']
+    changed = False
+    if cache['synced_at'] is not None:
+        updated = fetch_location_frame(conn, schema, sql.SQL("WHERE updated_at > %s ORDER BY id"),
+                                       (cache['synced_at'],))
+    else:
+        updated = fetch_location_frame(conn, schema, sql.SQL("ORDER BY id"))
+    cached = data[data['id'].isin(updated['id'])].sort_values('id', ignore_index=True)
+    if len(updated) and not cached.astype(object).equals(updated.astype(object)):
+        data = concat_location_frames([data[~data['id'].isin(updated['id'])], updated])
+        changed = True
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM locations")
+        count = cursor.fetchone()[0]
+        if count != len(data):
+            cursor.execute("SELECT id FROM locations")
+            ids = pd.Index([row[0] for row in cursor.fetchall()])
+    if count != len(data):
+        data = data[data['id'].isin(ids)]
+        missing = ids.difference(data['id'])
+        if len(missing):
+            missed = fetch_location_frame(conn, schema, sql.SQL("WHERE id = ANY(%s)"),
+                                          ([int(i) for i in missing],))
+            data = concat_location_frames([data, missed])
+        changed = True
+
+    if not changed:
+        # Advance the watermark in memory only; the persisted one just looks further back
+        return _locations_cache_entry(schema, data, synced_at), False
+    return _locations_cache_entry(schema, data.sort_values('id', ignore_index=True), synced_at), True
+
+def sync_locations_cache():
+    """
+    Return the locations table as a DataFrame from the local cache, syncing
+    it with the database first. The cache is kept in memory and persisted to
+    LOCATIONS_CACHE_PATH so new processes start warm. If the database can't
+    be reached, the last synced copy is returned.
+    """
+    global _locations_cache
+    with _locations_cache_lock:
+        cache = _locations_cache or _load_locations_cache()
+        try:
+            with db_connection() as conn:
+                cache, changed = _refresh_locations(conn, cache)
+            if changed:
+                _save_locations_cache(cache)
+        except Exception as e:
+            print(f"Error syncing location data: {e}")
+            if cache is None:
+                return None
+        _locations_cache = cache
+        return cache['data']
+
+class PostgresDataSource:
+    """
+    Locations, user profiles and recommendations in the PostgreSQL database
+    from DB_CONFIG, through the shared connection pool. Methods raise on
+    errors; the module-level functions report them.
+    """
+
+    def fetch_locations(self, use_cache=True, columns=None):
+        """
+        Locations as a DataFrame. By default this goes through the local
+        locations cache, which only pulls rows changed since its last sync.
+        `columns` limits the result to the columns a caller needs.
+        """
+        if use_cache:
+            locations = sync_locations_cache()
+            if locations is None:
+                return None
+            return (locations if columns is None else locations[list(columns)]).copy()
+
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                schema = _locations_schema(cursor)
+            if columns is not None:
+                schema = project_schema(schema, columns)
+            return fetch_location_frame(conn, schema)
+
+    def fetch_user_profile(self, user_id):
+        with db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                query = """
+                SELECT * FROM user_profiles WHERE user_id = %s
+                """
+                cursor.execute(query, (user_id,))
+                return cursor.fetchone()
+
+    def fetch_user_profiles(self, user_ids=None):
+        """User profiles as a DataFrame ordered by user_id, optionally only `user_ids`"""
+        with db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                if user_ids is None:
+                    cursor.execute("SELECT * FROM user_profiles ORDER BY user_id")
+                else:
+                    cursor.execute("SELECT * FROM user_profiles WHERE user_id = ANY(%s) ORDER BY user_id",
+                                   (list(user_ids),))
+                return pd.DataFrame(cursor.fetchall(), columns=[column.name for column in cursor.description])
+
+    def fetch_recommendations(self, user_id):
+        with db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                query = """
+                SELECT location_id, affordability_score::float8 AS affordability_score,
+                       match_score::float8 AS match_score, created_at
+                FROM user_recommendations WHERE user_id = %s
+                ORDER BY match_score DESC, location_id
+                """
+                cursor.execute(query, (user_id,))
+                return pd.DataFrame(cursor.fetchall(),
+                                    columns=['location_id', 'affordability_score', 'match_score', 'created_at'])
+
+    def save_predictions(self, rows, page_size=10000, replace_users=()):
         """
-        cursor.execute(query)
-        locations = cursor.fetchall()
-        return pd.DataFrame(locations)
+        Upsert {(user_id, location_id): (affordability_score, match_score)} in
+        one transaction, first deleting every stored row of `replace_users`
+        """
+        # A failed statement is rolled back when the connection goes back to the pool
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                if replace_users:
+                    cursor.execute("DELETE FROM user_recommendations WHERE user_id = ANY(%s)",
+                                   (list(replace_users),))
+                query = """
+                INSERT INTO user_recommendations 
+                (user_id, location_id, affordability_score, match_score, created_at)
+                VALUES %s
+                ON CONFLICT (user_id, location_id) 
+                DO UPDATE SET 
+                    affordability_score = EXCLUDED.affordability_score,
+                    match_score = EXCLUDED.match_score,
+                    created_at = NOW()
+                """
+                execute_values(cursor, query,
+                               [key + scores for key, scores in rows.items()],
+                               template="(%s, %s, %s, %s, NOW())", page_size=page_size)
+            conn.commit()
+
+def project_schema(schema, columns):
+    """Narrow (name, data_type) pairs to `columns`, in that order"""
+    types = dict(schema)
+    unknown = [name for name in columns if name not in types]
+    if unknown:
+        raise ValueError(f"Unknown location columns: {unknown}")
+    return [(name, types[name]) for name in columns]
+
+_data_source = None
+
+def get_data_source():
+    """The data source named by DATA_SOURCE, created on first use"""
+    global _data_source
+    if _data_source is None:
+        if DATA_SOURCE == 'sqlite':
+            from sqlite_source import SQLiteDataSource
+            _data_source = SQLiteDataSource(SQLITE_DB_PATH)
+        elif DATA_SOURCE == 'postgres':
+            _data_source = PostgresDataSource()
+        else:
+            raise ValueError(f"Unknown data source: {DATA_SOURCE}")
+    return _data_source
+
+def set_data_source(source):
+    """Use `source` (anything with the PostgresDataSource methods) from now on"""
+    global _data_source
+    _data_source = source
+
+def fetch_locations_data(use_cache=True, columns=None):
+    """
+    Fetch location data from the data source. With PostgreSQL this goes
+    through the local locations cache unless `use_cache` is False.
+    `columns` limits the result to the columns a caller needs.
+    """
+    try:
+        return get_data_source().fetch_locations(use_cache=use_cache, columns=columns)
     except Exception as e:
         print(f"Error fetching location data: {e}")
         return None
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def fetch_user_profile(user_id):
-    """Fetch user profile data from database"""
-    conn = connect_to_db()
-    if not conn:
-        return None
-    
+    """Fetch user profile data from the data source"""
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        query = """
-        SELECT * FROM user_profiles WHERE user_id = %s
-        """
-        cursor.execute(query, (user_id,))
-        profile = cursor.fetchone()
-        return profile
+        return get_data_source().fetch_user_profile(user_id)
     except Exception as e:
         print(f"Error fetching user profile: {e}")
         return None
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
-def preprocess_location_data(df):
-    """Preprocess location data for model training"""
-    if df is None or df.empty:
+def fetch_user_profiles(user_ids=None):
+    """All user profiles, or those of `user_ids`, as a DataFrame"""
+    try:
+        return get_data_source().fetch_user_profiles(user_ids)
+    except Exception as e:
+        print(f"Error fetching user profiles: {e}")
         return None
-    
-    # Handle missing values
-    df = df.fillna({
-        'cost_housing': df['cost_housing'].median(),
-        'cost_food': df['cost_food'].median(),
-        'cost_transportation': df['cost_transportation'].median(),
-        'cost_healthcare': df['cost_healthcare'].median(),
-        'cost_utilities': df['cost_utilities'].median(),
-        'median_income': df['median_income'].median(),
-        'unemployment_rate': df['unemployment_rate'].median(),
-        'job_growth_rate': df['job_growth_rate'].median()
-    })
-    
-    # Create a copy to avoid modifying the original dataframe
-    processed_df = df.copy()
-    
-    # Scale numerical features
-    scaler = StandardScaler()
-    if all(feature in processed_df.columns for feature in SCALING_FEATURES):
-        processed_df[SCALING_FEATURES] = scaler.fit_transform(processed_df[SCALING_FEATURES])
-        # Save the scaler for future use
-        joblib.dump(scaler, os.path.join(MODEL_DIR, 'scaler.joblib'))
-    
-    # One-hot encode categorical features
-    for feature in CATEGORICAL_FEATURES:
-        if feature in processed_df.columns:
-            encoder = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
-            encoded_features = encoder.fit_transform(processed_df[[feature]])
+
+def fetch_recommendations(user_id):
+    """A user's saved recommendations, best match first"""
+    try:
+        return get_data_source().fetch_recommendations(user_id)
+    except Exception as e:
+        print(f"Error fetching recommendations: {e}")
+        return None
+
+class LocationPreprocessor:
+    """
+    Location feature preprocessing, fitted once on training data and then
+    applied unchanged: median imputation and scaling of SCALING_FEATURES,
+    and one-hot encoding of CATEGORICAL_FEATURES.
+    """
+
+    def __init__(self):
+        self.medians = {}
+        self.scaler = None
+        self.encoders = {}
+
+    def fit(self, df):
+        """Learn medians, scaling and categories from training data"""
+        self.medians = {feature: df[feature].median() for feature in SCALING_FEATURES
+                        if feature in df.columns}
+        filled = df.fillna(self.medians)
+
+        self.scaler = None
+        if all(feature in filled.columns for feature in SCALING_FEATURES):
+            self.scaler = StandardScaler().fit(filled[SCALING_FEATURES])
+
+        self.encoders = {}
+        for feature in CATEGORICAL_FEATURES:
+            if feature in filled.columns:
+                encoder = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
+                self.encoders[feature] = encoder.fit(filled[[feature]])
+        return self
+
+    def transform(self, df):
+        """Apply the fitted preprocessing; never refits or touches disk"""
+        # fillna returns a copy, so the caller's dataframe is left alone
+        processed_df = df.fillna(self.medians)
+
+        if self.scaler is not None:
+            processed_df[SCALING_FEATURES] = self.scaler.transform(processed_df[SCALING_FEATURES])
+
+        for feature, encoder in self.encoders.items():
+            encoded_features = encoder.transform(processed_df[[feature]])
             feature_names = [f"{feature}_{val}" for val in encoder.categories_[0]]
-            encoded_df = pd.DataFrame(encoded_features, columns=feature_names)
-            processed_df = pd.concat([processed_df, encoded_df], axis=1)
-            processed_df = processed_df.drop(feature, axis=1)
-            # Save the encoder for future use
-            joblib.dump(encoder, os.path.join(MODEL_DIR, f'{feature}_encoder.joblib'))
-    
-    return processed_df
+            encoded_df = pd.DataFrame(encoded_features, columns=feature_names, index=processed_df.index)
+            processed_df = pd.concat([processed_df.drop(feature, axis=1), encoded_df], axis=1)
+
+        return processed_df
+
+    def save(self, path=PREPROCESSOR_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path=PREPROCESSOR_PATH):
+        return joblib.load(path)
+
+def preprocess_location_data(df, preprocessor=None):
+    """
+    Preprocess location data for model training. Applies `preprocessor` if
+    given, otherwise fits a new LocationPreprocessor on `df` itself.
+    """
+    if df is None or df.empty:
+        return None
+    if preprocessor is None:
+        preprocessor = LocationPreprocessor().fit(df)
+    return preprocessor.transform(df)
 
 def calculate_monthly_budget(income, housing_budget_preference):
     """Calculate monthly housing budget based on income and preference"""
@@ -124,31 +485,26 @@ def calculate_monthly_budget(income, housing_budget_preference):
     return monthly_income * budget_percentage
 
 def save_prediction_to_db(user_id, location_id, affordability_score, match_score):
-    """Save prediction results to database"""
-    conn = connect_to_db()
-    if not conn:
-        return False
-    
+    """Save prediction results to the data source"""
+    return save_predictions_to_db([(user_id, location_id, affordability_score, match_score)])
+
+def save_predictions_to_db(predictions, page_size=10000, replace_users=None):
+    """
+    Save many prediction results in one transaction. `predictions` is an
+    iterable of (user_id, location_id, affordability_score, match_score)
+    rows, for one user or many. Rows go out as a single multi-row upsert
+    per `page_size` rows; if a (user_id, location_id) pair repeats, its
+    last row wins. With `replace_users`, the stored recommendations of those
+    users are deleted in the same transaction, so only the new rows remain.
+    """
     try:
-        cursor = conn.cursor()
-        query = """
-        INSERT INTO user_recommendations 
-        (user_id, location_id, affordability_score, match_score, created_at)
-        VALUES (%s, %s, %s, %s, NOW())
-        ON CONFLICT (user_id, location_id) 
-        DO UPDATE SET 
-            affordability_score = EXCLUDED.affordability_score,
-            match_score = EXCLUDED.match_score,
-            created_at = NOW()
-        """
-        cursor.execute(query, (user_id, location_id, affordability_score, match_score))
-        conn.commit()
+        rows = {}
+        for user_id, location_id, affordability_score, match_score in predictions:
+            rows[(int(user_id), int(location_id))] = (float(affordability_score), float(match_score))
+        replace_users = sorted({int(user_id) for user_id in replace_users or ()})
+        if rows or replace_users:
+            get_data_source().save_predictions(rows, page_size=page_size, replace_users=replace_users)
         return True
     except Exception as e:
-        print(f"Error saving prediction to database: {e}")
-        conn.rollback()
+        print(f"Error saving predictions to database: {e}")
         return False
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
\ No newline at end of file
@@ -0,0 +1,132 @@
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool's timeout"""
+
+class ConnectionPool:
+    """
+    Thread-safe pool of PostgreSQL connections.
+
+    `connect` opens a new connection. `min_connections` are opened up front
+    and at most `max_connections` are open at once. A connection that has
+    been idle longer than `health_check_interval` seconds is checked with
+    SELECT 1 before it is handed out, and closed or broken connections are
+    replaced with fresh ones.
+    """
+
+    def __init__(self, connect, min_connections=1, max_connections=10,
+                 health_check_interval=30.0, timeout=30.0):
+        if max_connections < 1 or min_connections > max_connections:
+            raise ValueError("Pool needs 1 <= max_connections and min_connections <= max_connections")
+        self.connect = connect
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self.idle = []  # (connection, time it was returned)
+        self.size = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+        for _ in range(min_connections):
+            conn = self.connect()
+            self.size += 1
+            self.idle.append((conn, time.monotonic()))
+
+    def _healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def getconn(self):
+        """Check out a healthy connection, opening one if the pool has room"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self.condition:
+                while True:
+                    if self.closed:
+                        raise psycopg2.InterfaceError("Connection pool is closed")
+                    if self.idle:
+                        conn, idle_since = self.idle.pop()
+                        break
+                    if self.size < self.max_connections:
+                        self.size += 1
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection free after {self.timeout}s")
+                    self.condition.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self.connect()
+                except Exception:
+                    with self.condition:
+                        self.size -= 1
+                        self.condition.notify()
+                    raise
+            if self._healthy(conn, idle_since):
+                return conn
+            # Dead connection: drop it and try again, reconnecting if needed
+            self._discard(conn)
+
+    def putconn(self, conn, broken=False):
+        """Return a connection; broken or closed ones are closed and not reused"""
+        if not broken and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        if broken or conn.closed or self.closed:
+            self._discard(conn)
+            return
+        with self.condition:
+            self.idle.append((conn, time.monotonic()))
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for a `with` block and return it afterwards"""
+        conn = self.getconn()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(conn, broken=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def closeall(self):
+        """Close idle connections; ones still checked out close when returned"""
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.condition.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
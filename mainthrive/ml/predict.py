@@ -1,17 +1,49 @@
 import sys
 import json
+import math
+import queue
+import signal
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
 import pandas as pd
 from affordability_model import AffordabilityModel
-from recommendation_model import RecommendationModel
-from data_utils import fetch_locations_data, fetch_user_profile, save_prediction_to_db
+from recommendation_model import RecommendationModel, USER_FEATURES
+from batch_recommendations import top_k_keys, decode_keys
+from config import PREDICT_WORKER_THREADS, PREDICT_BATCH_CHUNK_SIZE, BATCH_LOCATION_BLOCK_SIZE, SCALING_FEATURES
+from data_utils import fetch_locations_data, fetch_user_profile, fetch_user_profiles, save_predictions_to_db
 
-def predict_affordability(location_data):
+_affordability_model = None
+_recommendation_model = None
+
+def get_affordability_model():
+    """The affordability model, loaded from disk once per process"""
+    global _affordability_model
+    if _affordability_model is None:
+        _affordability_model = AffordabilityModel()
+        
+        # Try to load trained model
+        if not _affordability_model.load():
+            print("No trained model found. Using rule-based scoring.")
+    return _affordability_model
+
+def get_recommendation_model():
+    """The recommendation model, loaded from disk once per process"""
+    global _recommendation_model
+    if _recommendation_model is None:
+        _recommendation_model = RecommendationModel()
+        
+        # Try to load trained model
+        if not _recommendation_model.load():
+            print("No trained model found. Using rule-based recommendations.")
+    return _recommendation_model
+
+def predict_affordability(location_data, model=None):
     """Predict affordability score for a location"""
-    model = AffordabilityModel()
-    
-    # Try to load trained model
-    if not model.load():
-        print("No trained model found. Using rule-based scoring.")
+    if model is None:
+        model = get_affordability_model()
     
     # Convert to DataFrame if it's a dict
     if isinstance(location_data, dict):
@@ -25,8 +57,12 @@ def predict_affordability(location_data):
     
     return scores, categories
 
-def generate_recommendations(user_id):
-    """Generate location recommendations for a user"""
+def generate_recommendations(user_id, locations_df=None, model=None, save=True):
+    """
+    Generate location recommendations for a user. Locations are fetched
+    and the model loaded unless given. With save=False the caller saves
+    them with save_recommendations.
+    """
     # Fetch user profile
     user_profile = fetch_user_profile(user_id)
     
@@ -35,33 +71,466 @@ def generate_recommendations(user_id):
         return None
     
     # Fetch location data
-    locations_df = fetch_locations_data()
+    if locations_df is None:
+        locations_df = fetch_locations_data()
     
     if locations_df is None:
         print("No location data available.")
         return None
     
-    # Initialize recommendation model
-    model = RecommendationModel()
-    
-    # Try to load trained model
-    if not model.load():
-        print("No trained model found. Using rule-based recommendations.")
+    if model is None:
+        model = get_recommendation_model()
     
     # Generate recommendations
     recommendations = model.predict(user_profile, locations_df)
     
-    # Save predictions to database
-    for _, location in recommendations.iterrows():
-        save_prediction_to_db(
-            user_id, 
-            location['id'], 
-            location['affordability_score'], 
-            location['match_score']
-        )
+    if save:
+        save_recommendations(user_id, recommendations)
     
     return recommendations
 
+def save_recommendations(user_id, recommendations):
+    """Save a user's recommendations to the database in one round-trip"""
+    return save_predictions_to_db(zip(
+        [user_id] * len(recommendations),
+        recommendations['id'].tolist(),
+        recommendations['affordability_score'].tolist(),
+        recommendations['match_score'].tolist()
+    ))
+
+def affordability_result(locations_df, location_id, model=None):
+    """The affordability response for one location, or None if it is unknown"""
+    # Filter for the requested location
+    location_data = locations_df[locations_df['id'] == int(location_id)]
+    
+    if len(location_data) == 0:
+        return None
+    
+    # Predict affordability
+    scores, categories = predict_affordability(location_data, model)
+    
+    return {
+        "location_id": int(location_id),
+        "affordability_score": float(scores[0]),
+        "affordability_category": categories[0]
+    }
+
+def recommendations_result(recommendations, limit=10):
+    """The recommendations response: the best `limit` matches"""
+    results = []
+    for _, location in recommendations.head(limit).iterrows():
+        results.append({
+            "location_id": int(location['id']),
+            "city": location['city'],
+            "state": location['state'],
+            "match_score": float(location['match_score']),
+            "affordability_score": float(location['affordability_score'])
+        })
+    
+    return {"recommendations": results}
+
+def record_id(record, key):
+    """record[key] as an int, or None if it is not a number"""
+    try:
+        return int(record[key])
+    except (TypeError, ValueError):
+        return None
+
+def required_int(request, key):
+    """request[key] as an int, with an explicit error if it is missing or not a number"""
+    if request.get(key) is None:
+        raise ValueError(f"Missing required field: {key}")
+    value = record_id(request, key)
+    if value is None:
+        raise ValueError(f"{key} must be an integer, got {request[key]!r}")
+    return value
+
+class PredictionWorker:
+    """
+    Long-lived prediction process. Models and location data stay loaded
+    between requests, which arrive as JSON lines, e.g.
+    {"id": 1, "command": "recommendations", "user_id": 7}. Each gets one
+    JSON line back with the same id and either "result" or "error".
+    Requests run concurrently on a thread pool. "reload" (or SIGHUP)
+    reloads models and syncs locations in the background, and swaps them
+    in once loaded. Recommendations are saved to the database after the
+    response has been sent.
+    """
+    
+    def __init__(self, threads=PREDICT_WORKER_THREADS):
+        self.threads = threads
+        self.state = None  # (affordability model, recommendation model, locations)
+        self.reload_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.saves = queue.Queue()
+        self.output = None
+    
+    def reload(self):
+        """Load models and locations, then swap them in for new requests"""
+        with self.reload_lock:
+            affordability_model = AffordabilityModel()
+            if not affordability_model.load():
+                print("No trained model found. Using rule-based scoring.")
+            recommendation_model = RecommendationModel()
+            if not recommendation_model.load():
+                print("No trained model found. Using rule-based recommendations.")
+            locations_df = fetch_locations_data()
+            if locations_df is None:
+                if self.state is None:
+                    raise RuntimeError("No location data available.")
+                # Keep serving the locations already loaded
+                locations_df = self.state[2]
+            self.state = (affordability_model, recommendation_model, locations_df)
+            return {"locations": len(locations_df)}
+    
+    def handle(self, request):
+        """Run one request against the current state; returns its result"""
+        command = request.get('command')
+        if command is None:
+            raise ValueError("Missing required field: command")
+        affordability_model, recommendation_model, locations_df = self.state
+        
+        if command == 'affordability':
+            location_id = required_int(request, 'location_id')
+            result = affordability_result(locations_df, location_id, affordability_model)
+            if result is None:
+                raise LookupError(f"Location not found with ID: {location_id}")
+            return result
+        if command == 'recommendations':
+            user_id = required_int(request, 'user_id')
+            limit = 10 if request.get('limit') is None else required_int(request, 'limit')
+            if limit < 1:
+                raise ValueError(f"limit must be positive, got {limit}")
+            recommendations = generate_recommendations(user_id, locations_df, recommendation_model, save=False)
+            if recommendations is None:
+                raise LookupError("Failed to generate recommendations")
+            self.saves.put((user_id, recommendations))
+            return recommendations_result(recommendations, limit)
+        if command == 'reload':
+            return self.reload()
+        if command == 'ping':
+            return {"locations": len(locations_df)}
+        raise ValueError(f"Unknown command: {command}")
+    
+    def respond(self, response):
+        with self.write_lock:
+            self.output.write(json.dumps(response) + "\n")
+            self.output.flush()
+    
+    def run_request(self, request):
+        try:
+            self.respond({"id": request.get('id'), "result": self.handle(request)})
+        except Exception as e:
+            self.respond({"id": request.get('id'), "error": str(e)})
+    
+    def save_recommendations(self):
+        """Save queued recommendations until a None arrives"""
+        while True:
+            item = self.saves.get()
+            if item is None:
+                return
+            save_recommendations(*item)
+    
+    def serve(self, input=sys.stdin, output=sys.stdout):
+        """Answer JSON-line requests from `input` until it closes"""
+        self.output = output
+        # Progress and error messages from the ml modules go to stderr
+        # so they never interleave with responses
+        sys.stdout = sys.stderr
+        
+        self.reload()
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=self.reload).start())
+        
+        saver = threading.Thread(target=self.save_recommendations)
+        saver.start()
+        self.respond({"ready": True, "locations": len(self.state[2])})
+        
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            for line in input:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    self.respond({"id": None, "error": f"Invalid request: {e}"})
+                    continue
+                if not isinstance(request, dict):
+                    self.respond({"id": None, "error": "request must be a JSON object"})
+                    continue
+                if 'id' not in request:
+                    self.respond({"id": None, "error": "Missing required field: id"})
+                    continue
+                executor.submit(self.run_request, request)
+        
+        # Finish pending saves before exiting
+        self.saves.put(None)
+        saver.join()
+
+def read_records(lines, id_key):
+    """
+    Parse JSON lines into records. A bare number n becomes {id_key: n}.
+    Lines that do not parse become {"error": ...} records.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield {"error": f"Invalid record: {e}"}
+            continue
+        if isinstance(record, (int, float)) and not isinstance(record, bool):
+            record = {id_key: int(record)}
+        elif not isinstance(record, dict):
+            record = {"error": "Records must be JSON objects or ids"}
+        yield record
+
+def chunks(records, chunk_size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def number_error(record, key):
+    """Why record[key] is not a usable number, or None if it is one"""
+    value = record[key]
+    try:
+        if isinstance(value, bool) or not math.isfinite(float(value)):
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        return f"{key} must be a number, got {value!r}"
+    return None
+
+def location_error(record):
+    """Why an inline location row can't be scored, or None"""
+    if record.get('id') is not None and record_id(record, 'id') is None:
+        return f"id must be an integer, got {record['id']!r}"
+    for feature in SCALING_FEATURES:
+        if feature in record:
+            error = number_error(record, feature)
+            if error:
+                return error
+    return None
+
+def profile_error(profile):
+    """Why a user profile can't be scored, or None"""
+    missing = [feature for feature in USER_FEATURES if feature not in profile]
+    if missing:
+        return f"Profile is missing {missing}"
+    error = number_error(profile, 'income')
+    if error:
+        return error
+    for feature in ('housing_budget_preference', 'transportation_preference', 'safety_importance'):
+        if not isinstance(profile[feature], str):
+            return f"{feature} must be a string, got {profile[feature]!r}"
+    if not isinstance(profile['requires_healthcare'], (bool, np.bool_)):
+        return f"requires_healthcare must be true or false, got {profile['requires_healthcare']!r}"
+    return None
+
+def batch_affordability(records, output, chunk_size=PREDICT_BATCH_CHUNK_SIZE):
+    """
+    Score each record and write one JSON line per record, in order. A
+    record is either {"location_id": n}, looked up in the locations table
+    (fetched once, on first use), or a full location row. A record that
+    can't be scored gets an error line of its own.
+    """
+    model = get_affordability_model()
+    location_index = None
+    
+    def score(location_id, location_data):
+        try:
+            scores, categories = predict_affordability(location_data, model)
+        except Exception as e:
+            return {"location_id": location_id, "error": str(e)}
+        return {
+            "location_id": location_id,
+            "affordability_score": float(np.asarray(scores)[0]),
+            "affordability_category": categories[0]
+        }
+    
+    for chunk in chunks(records, chunk_size):
+        results = [None] * len(chunk)
+        lookups = []
+        for i, record in enumerate(chunk):
+            if 'error' in record:
+                results[i] = record
+            elif set(record) == {'location_id'}:
+                if record_id(record, 'location_id') is None:
+                    results[i] = {"location_id": record['location_id'],
+                                  "error": f"location_id must be an integer, got {record['location_id']!r}"}
+                else:
+                    lookups.append(i)
+            else:
+                # Inline rows are checked and scored one at a time, so a bad one fails alone
+                error = location_error(record)
+                location_id = record_id(record, 'id') if record.get('id') is not None else None
+                if error:
+                    results[i] = {"location_id": record.get('id'), "error": error}
+                else:
+                    results[i] = score(location_id, pd.DataFrame([record]))
+        
+        if lookups:
+            if location_index is None:
+                locations_df = fetch_locations_data()
+                if locations_df is None:
+                    raise RuntimeError("No location data available.")
+                location_index = (locations_df, pd.Index(locations_df['id']))
+            locations_df, ids = location_index
+            location_ids = [int(chunk[i]['location_id']) for i in lookups]
+            positions = ids.get_indexer(location_ids)
+            found = []
+            for i, location_id, position in zip(lookups, location_ids, positions):
+                if position < 0:
+                    results[i] = {"location_id": location_id, "error": f"Location not found with ID: {location_id}"}
+                else:
+                    found.append((i, location_id, position))
+            # Rule-based scores are normalized across the rows scored together,
+            # so without a trained model each is scored on its own, as single
+            # requests are
+            scored = None
+            if found and model.model is not None:
+                try:
+                    scores, categories = predict_affordability(locations_df.iloc[[p for _, _, p in found]], model)
+                    scored = list(zip(np.asarray(scores), categories))
+                except Exception:
+                    scored = None
+            for n, (i, location_id, position) in enumerate(found):
+                if scored is None:
+                    results[i] = score(location_id, locations_df.iloc[[position]])
+                else:
+                    results[i] = {
+                        "location_id": location_id,
+                        "affordability_score": float(scored[n][0]),
+                        "affordability_category": scored[n][1]
+                    }
+        
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+        output.flush()
+
+def batch_recommendations(records, output, chunk_size=PREDICT_BATCH_CHUNK_SIZE, limit=10, save=False):
+    """
+    Recommend locations for each record and write one JSON line per
+    record, in order. A record is either {"user_id": n}, whose profile is
+    fetched, or a full profile. Locations and models are loaded once and
+    each chunk of users is scored together; with `save` the `limit`
+    recommendations of users with a user_id are saved.
+    """
+    model = get_recommendation_model()
+    locations_df = fetch_locations_data()
+    if locations_df is None:
+        raise RuntimeError("No location data available.")
+    
+    locations = model.encode_locations(locations_df)
+    clustered = model.model is not None and model.kmeans is not None
+    if clustered:
+        partitions = model.cluster_partitions(locations_df)
+    else:
+        partitions = {0: np.arange(len(locations_df))}
+    
+    for chunk in chunks(records, chunk_size):
+        results = [None] * len(chunk)
+        for i, record in enumerate(chunk):
+            if 'error' not in record and record.get('user_id') is not None and record_id(record, 'user_id') is None:
+                results[i] = {"user_id": record['user_id'],
+                              "error": f"user_id must be an integer, got {record['user_id']!r}"}
+        lookup_ids = [int(record['user_id']) for i, record in enumerate(chunk)
+                      if results[i] is None and 'error' not in record and set(record) == {'user_id'}]
+        profiles_by_id = {}
+        if lookup_ids:
+            fetched = fetch_user_profiles(lookup_ids)
+            if fetched is None:
+                raise RuntimeError("Could not fetch user profiles.")
+            profiles_by_id = {int(profile['user_id']): profile for profile in fetched.to_dict('records')}
+        
+        rows = []
+        profiles = []
+        for i, record in enumerate(chunk):
+            if 'error' in record:
+                results[i] = record
+            if results[i] is not None:
+                continue
+            profile = profiles_by_id.get(int(record['user_id'])) if set(record) == {'user_id'} else record
+            error = (f"User profile not found for user ID: {record['user_id']}" if profile is None
+                     else profile_error(profile))
+            if error:
+                results[i] = {"user_id": record.get('user_id'), "error": error}
+                continue
+            rows.append(i)
+            profiles.append(profile)
+        
+        if rows:
+            profiles_df = pd.DataFrame(profiles)
+            profiles_df['income'] = profiles_df['income'].astype(float)
+            users = model.encode_user_profiles(profiles_df)
+            if clustered:
+                user_partitions = model.preferred_clusters(profiles_df)
+            else:
+                user_partitions = np.zeros(len(rows), dtype=np.intp)
+            
+            saves = []
+            for partition in np.unique(user_partitions):
+                members = np.flatnonzero(user_partitions == partition)
+                keys = top_k_keys(model, locations, partitions.get(int(partition), np.empty(0, dtype=np.intp)),
+                                  {name: values[members] for name, values in users.items()},
+                                  limit, BATCH_LOCATION_BLOCK_SIZE)
+                positions, match_scores = decode_keys(keys, len(locations_df))
+                for member, member_positions, member_scores in zip(members, positions, match_scores):
+                    matches = locations_df.iloc[member_positions]
+                    user_id = profiles[member].get('user_id')
+                    results[rows[member]] = {
+                        "user_id": user_id,
+                        "recommendations": [{
+                            "location_id": int(location_id),
+                            "city": city,
+                            "state": state,
+                            "match_score": float(match_score),
+                            "affordability_score": float(affordability_score)
+                        } for location_id, city, state, match_score, affordability_score in zip(
+                            matches['id'], matches['city'], matches['state'],
+                            member_scores, matches['affordability_score'])]
+                    }
+                    if save and user_id is not None:
+                        saves.extend(zip([user_id] * len(matches), matches['id'].tolist(),
+                                         matches['affordability_score'].tolist(), member_scores.tolist()))
+            if saves:
+                save_predictions_to_db(saves)
+        
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+        output.flush()
+
+def run_batch(args):
+    """`predict.py batch`: score JSON-line records from a file or stdin"""
+    parser = argparse.ArgumentParser(prog='predict.py batch',
+                                     description="Score many records, one JSON result per line")
+    parser.add_argument('command', choices=['affordability', 'recommendations'])
+    parser.add_argument('input', nargs='?', default='-', help="JSONL file of ids or records; default stdin")
+    parser.add_argument('--chunk-size', type=int, default=PREDICT_BATCH_CHUNK_SIZE)
+    parser.add_argument('--limit', type=int, default=10, help="recommendations per user")
+    parser.add_argument('--save', action='store_true', help="save recommendations to the database")
+    args = parser.parse_args(args)
+    if args.limit < 1 or args.chunk_size < 1:
+        parser.error("--limit and --chunk-size must be positive")
+    
+    output = sys.stdout
+    # Progress and error messages from the ml modules go to stderr
+    sys.stdout = sys.stderr
+    
+    lines = sys.stdin if args.input == '-' else open(args.input)
+    try:
+        if args.command == 'affordability':
+            batch_affordability(read_records(lines, 'location_id'), output, args.chunk_size)
+        else:
+            batch_recommendations(read_records(lines, 'user_id'), output, args.chunk_size,
+                                  args.limit, args.save)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
 def main():
     """Main function to handle prediction requests"""
     if len(sys.argv) < 2:
@@ -69,6 +538,8 @@ def main():
         print("Commands:")
         print("  affordability <location_id>")
         print("  recommendations <user_id>")
+        print("  serve    (JSON-line requests on stdin, responses on stdout)")
+        print("  batch <affordability|recommendations> [file]    (JSON lines in, one result per line out)")
         return
     
     command = sys.argv[1]
@@ -83,23 +554,13 @@ def main():
             print("No location data available.")
             return
         
-        # Filter for the requested location
-        location_data = locations_df[locations_df['id'] == int(location_id)]
+        result = affordability_result(locations_df, location_id)
         
-        if len(location_data) == 0:
+        if result is None:
             print(f"Location not found with ID: {location_id}")
             return
         
-        # Predict affordability
-        scores, categories = predict_affordability(location_data)
-        
         # Output results
-        result = {
-            "location_id": int(location_id),
-            "affordability_score": float(scores[0]),
-            "affordability_category": categories[0]
-        }
-        
         print(json.dumps(result))
         
     elif command == "recommendations" and len(sys.argv) >= 3:
@@ -113,17 +574,13 @@ def main():
             return
         
         # Format results
-        results = []
-        for _, location in recommendations.head(10).iterrows():
-            results.append({
-                "location_id": int(location['id']),
-                "city": location['city'],
-                "state": location['state'],
-                "match_score": float(location['match_score']),
-                "affordability_score": float(location['affordability_score'])
-            })
-        
-        print(json.dumps({"recommendations": results}))
+        print(json.dumps(recommendations_result(recommendations)))
+        
+    elif command == "serve":
+        PredictionWorker().serve()
+        
+    elif command == "batch":
+        run_batch(sys.argv[2:])
         
     else:
         print("Invalid command or missing arguments.")
@@ -131,6 +588,8 @@ def main():
         print("Commands:")
         print("  affordability <location_id>")
         print("  recommendations <user_id>")
+        print("  serve    (JSON-line requests on stdin, responses on stdout)")
+        print("  batch <affordability|recommendations> [file]    (JSON lines in, one result per line out)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
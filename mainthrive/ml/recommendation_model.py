@@ -5,15 +5,117 @@ from sklearn.cluster import KMeans
 from sklearn.model_selection import train_test_split
 import joblib
 import os
-from config import RECOMMENDATION_WEIGHTS, RECOMMENDATION_MODEL_PATH
+import threading
+from config import RECOMMENDATION_WEIGHTS, RECOMMENDATION_MODEL_PATH, CLUSTER_INDEX_PATH
 from data_utils import fetch_locations_data, fetch_user_profile, preprocess_location_data
 
+# Location column each transportation preference is scored on
+TRANSPORT_SCORE_COLUMNS = {
+    'public-transit': 'public_transit_score',
+    'bike-walking': 'walkability_score',
+    'car': 'traffic_score'
+}
+SAFETY_IMPORTANCE = ['very-important', 'somewhat-important']
+
+# Profile fields the cluster classifier is trained on
+USER_FEATURES = [
+    'income', 'housing_budget_preference', 'requires_healthcare',
+    'transportation_preference', 'safety_importance'
+]
+
+class ClusterIndex:
+    """
+    The k-means cluster of every location, kept on disk so that
+    predictions look labels up instead of reclassifying every location.
+    `sync` brings the labels up to date with a locations frame: only
+    locations that are new, or whose updated_at differs from the one their
+    label was computed for, are classified, and deleted ones are dropped.
+    Comparing each row's own updated_at means a row that commits late with
+    an older timestamp is still relabelled. `partitions` then maps each
+    cluster to the row positions of its locations in that frame.
+    """
+    
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)  # sorted location ids
+        self.labels = np.empty(0, dtype=np.int32)
+        self.updated = None  # each location's updated_at in ns, or None if not tracked
+        self.frame = None  # the frame `partitions` refers to
+        self.partitions = {}
+        self.lock = threading.Lock()
+    
+    def __getstate__(self):
+        return {'ids': self.ids, 'labels': self.labels, 'updated': self.updated}
+    
+    def __setstate__(self, state):
+        self.__init__()
+        # Indexes saved with a single watermark have no per-row times, so
+        # their locations are all relabelled on the next sync
+        state.pop('watermark', None)
+        self.__dict__.update(state)
+    
+    def sync(self, locations_df, classify):
+        """
+        Label the rows of locations_df, calling `classify` on those that
+        need it. Returns True if any labels changed. Without an updated_at
+        column only unknown ids are classified.
+        """
+        with self.lock:
+            if locations_df is self.frame:
+                return False
+            
+            ids = locations_df['id'].to_numpy().astype(np.int64)
+            found = np.searchsorted(self.ids, ids).clip(max=max(len(self.ids) - 1, 0))
+            known = (self.ids[found] == ids) if len(self.ids) else np.zeros(len(ids), dtype=bool)
+            stale = ~known
+            updated = None
+            if 'updated_at' in locations_df.columns:
+                # As integers, so that missing (NaT) timestamps compare equal
+                updated = locations_df['updated_at'].to_numpy().astype('datetime64[ns]').view(np.int64)
+                if self.updated is None:
+                    stale[:] = True
+                elif len(self.ids):
+                    stale |= known & (self.updated[found] != updated)
+            
+            labels = np.empty(len(ids), dtype=np.int32)
+            labels[known] = self.labels[found[known]]
+            if stale.any():
+                labels[stale] = classify(locations_df[stale])
+            changed = bool(stale.any()) or known.sum() != len(self.ids)
+            
+            order = np.argsort(ids, kind='stable')
+            self.ids, self.labels = ids[order], labels[order]
+            self.updated = None if updated is None else updated[order]
+            self.partitions = {int(cluster): np.flatnonzero(labels == cluster) for cluster in np.unique(labels)}
+            self.frame = locations_df
+            return changed
+    
+    def save(self, path=None):
+        path = path or CLUSTER_INDEX_PATH
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial file;
+        # the temporary name is per process, as the worker, the batch job
+        # and the CLI may save at the same time, and the lock covers the
+        # worker's threads
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with self.lock:
+            joblib.dump(self, tmp_path)
+            os.replace(tmp_path, path)
+    
+    @staticmethod
+    def load(path=None):
+        """The saved index, or an empty one that labels everything on first sync"""
+        path = path or CLUSTER_INDEX_PATH
+        if os.path.exists(path):
+            return joblib.load(path)
+        return ClusterIndex()
+
 class RecommendationModel:
     """Model for generating personalized location recommendations"""
     
     def __init__(self):
         self.model = None
         self.kmeans = None
+        self.cluster_index = None
         self.weights = RECOMMENDATION_WEIGHTS
     
     def calculate_match_score(self, location, user_profile):
@@ -66,6 +168,145 @@ class RecommendationModel:
         
         return match_score
     
+    def calculate_match_scores(self, locations_df, user_profile):
+        """Match scores for every row of locations_df; same rules as calculate_match_score"""
+        match_scores = np.zeros(len(locations_df), dtype=np.int64)
+        
+        # Housing budget match
+        monthly_income = user_profile['income'] / 12
+        if user_profile['housing_budget_preference'] == 'less-than-30':
+            budget_percentage = 0.25
+        elif user_profile['housing_budget_preference'] == '30-40':
+            budget_percentage = 0.35
+        else:  # '40-plus'
+            budget_percentage = 0.45
+        
+        housing_budget = monthly_income * budget_percentage
+        
+        cost_housing = locations_df['cost_housing'].to_numpy()
+        match_scores += np.select(
+            [cost_housing <= housing_budget,
+             cost_housing <= housing_budget * 1.2,
+             cost_housing <= housing_budget * 1.5],
+            [30, 20, 10], 0)
+        
+        # Healthcare importance
+        if user_profile['requires_healthcare']:
+            healthcare_score = locations_df['healthcare_score'].to_numpy()
+            match_scores += np.select([healthcare_score >= 75, healthcare_score >= 60], [15, 10], 5)
+        
+        # Transportation preference
+        transport_column = TRANSPORT_SCORE_COLUMNS.get(user_profile['transportation_preference'])
+        if transport_column is not None:
+            match_scores += np.where(locations_df[transport_column].to_numpy() >= 70, 15, 0)
+        
+        # Safety importance
+        if user_profile['safety_importance'] == 'very-important':
+            match_scores += np.where(locations_df['safety_score'].to_numpy() >= 80, 20, 0)
+        elif user_profile['safety_importance'] == 'somewhat-important':
+            match_scores += np.where(locations_df['safety_score'].to_numpy() >= 70, 10, 0)
+        
+        # Normalize to 0-100 scale
+        return np.minimum(match_scores, 100)
+    
+    def encode_locations(self, locations_df):
+        """
+        Per-location arrays for match_score_matrix: housing cost, and the
+        points each healthcare, transportation and safety rule would add
+        """
+        healthcare_score = locations_df['healthcare_score'].to_numpy()
+        safety_score = locations_df['safety_score'].to_numpy()
+        no_points = np.zeros(len(locations_df), dtype=np.int64)
+        return {
+            'cost_housing': locations_df['cost_housing'].to_numpy(),
+            'healthcare_points': np.select([healthcare_score >= 75, healthcare_score >= 60], [15, 10], 5),
+            # One row per TRANSPORT_SCORE_COLUMNS entry, then one for other preferences
+            'transport_points': np.stack(
+                [np.where(locations_df[column].to_numpy() >= 70, 15, 0) for column in TRANSPORT_SCORE_COLUMNS.values()]
+                + [no_points]),
+            # One row per SAFETY_IMPORTANCE entry, then one for 'not-important'
+            'safety_points': np.stack([
+                np.where(safety_score >= 80, 20, 0),
+                np.where(safety_score >= 70, 10, 0),
+                no_points])
+        }
+    
+    def encode_user_profiles(self, profiles_df):
+        """
+        Per-user arrays for match_score_matrix: the three housing budget
+        thresholds, whether healthcare counts, and which transportation and
+        safety rule applies
+        """
+        monthly_income = profiles_df['income'].astype(float).to_numpy() / 12
+        budget_preference = profiles_df['housing_budget_preference'].to_numpy()
+        budget_percentage = np.select(
+            [budget_preference == 'less-than-30', budget_preference == '30-40'], [0.25, 0.35], 0.45)
+        housing_budget = monthly_income * budget_percentage
+        
+        transport_codes = {preference: code for code, preference in enumerate(TRANSPORT_SCORE_COLUMNS)}
+        safety_codes = {importance: code for code, importance in enumerate(SAFETY_IMPORTANCE)}
+        return {
+            'budget_thresholds': np.column_stack([housing_budget, housing_budget * 1.2, housing_budget * 1.5]),
+            'requires_healthcare': profiles_df['requires_healthcare'].astype(bool).to_numpy(),
+            'transport': np.array([transport_codes.get(preference, len(transport_codes))
+                                   for preference in profiles_df['transportation_preference']], dtype=np.intp),
+            'safety': np.array([safety_codes.get(importance, len(safety_codes))
+                                for importance in profiles_df['safety_importance']], dtype=np.intp)
+        }
+    
+    def match_score_matrix(self, locations, users):
+        """
+        Match scores of encoded users (rows) against encoded locations
+        (columns); row i equals calculate_match_scores for user i
+        """
+        cost_housing = locations['cost_housing']
+        thresholds = users['budget_thresholds']
+        if np.issubdtype(cost_housing.dtype, np.floating):
+            # Compare in the column's precision, as a scalar budget would be
+            thresholds = thresholds.astype(cost_housing.dtype)
+        
+        match_scores = np.select(
+            [cost_housing <= thresholds[:, [0]],
+             cost_housing <= thresholds[:, [1]],
+             cost_housing <= thresholds[:, [2]]],
+            [30, 20, 10], 0)
+        match_scores += np.where(users['requires_healthcare'][:, None], locations['healthcare_points'], 0)
+        match_scores += locations['transport_points'][users['transport']]
+        match_scores += locations['safety_points'][users['safety']]
+        
+        # Normalize to 0-100 scale
+        return np.minimum(match_scores, 100)
+    
+    def classify_locations(self, locations_df):
+        """Run k-means on locations to find their clusters"""
+        cluster_features = [
+            'affordability_score', 'safety_score', 'education_score', 
+            'healthcare_score', 'walkability_score', 'public_transit_score'
+        ]
+        
+        # Ensure all features exist
+        valid_features = [f for f in cluster_features if f in locations_df.columns]
+        return self.kmeans.predict(locations_df[valid_features])
+    
+    def cluster_partitions(self, locations_df):
+        """
+        Row positions of each cluster's locations in locations_df, from the
+        saved cluster labels. Locations added or updated since the labels
+        were saved are classified and the labels saved again.
+        """
+        if self.cluster_index is None:
+            self.cluster_index = ClusterIndex.load()
+        if self.cluster_index.sync(locations_df, self.classify_locations):
+            self.cluster_index.save()
+        return self.cluster_index.partitions
+    
+    def preferred_clusters(self, profiles_df):
+        """The location cluster the trained classifier picks for each user"""
+        # One-hot encode, then add any columns from training that are missing
+        user_encoded = pd.get_dummies(profiles_df[USER_FEATURES])
+        user_encoded = user_encoded.reindex(columns=self.model.feature_names_in_, fill_value=0)
+        return self.model.predict(user_encoded)
+    
     def train(self, locations_df=None, user_profiles_df=None):
         """Train the recommendation model using location data and user profiles"""
         if locations_df is None:
@@ -100,8 +341,11 @@ class RecommendationModel:
             self.kmeans = KMeans(n_clusters=5, random_state=42)
             locations_df['cluster'] = self.kmeans.fit_predict(locations_df[valid_features])
             
-            # Save the clustering model
+            # Save the clustering model and each location's cluster
             joblib.dump(self.kmeans, os.path.join(os.path.dirname(RECOMMENDATION_MODEL_PATH), 'kmeans_model.joblib'))
+            self.cluster_index = ClusterIndex()
+            self.cluster_index.sync(locations_df, lambda rows: rows['cluster'].to_numpy())
+            self.cluster_index.save()
             
             # Train a classifier to predict which cluster a user would prefer
             # For now, we'll use a simple random forest classifier
@@ -154,13 +398,18 @@ class RecommendationModel:
             kmeans_path = os.path.join(os.path.dirname(RECOMMENDATION_MODEL_PATH), 'kmeans_model.joblib')
             if os.path.exists(kmeans_path):
                 self.kmeans = joblib.load(kmeans_path)
+                self.cluster_index = ClusterIndex.load()
             return True
         except:
             print(f"No trained models found at {RECOMMENDATION_MODEL_PATH}")
             return False
     
     def predict(self, user_profile, locations_df=None):
-        """Generate location recommendations for a user"""
+        """
+        Generate location recommendations for a user. Returns a new frame
+        and leaves locations_df untouched, so one frame can serve many
+        concurrent predictions.
+        """
         if locations_df is None:
             # Fetch data if not provided
             locations_df = fetch_locations_data()
@@ -172,67 +421,28 @@ class RecommendationModel:
         # If we have a trained model, use it
         if self.model is not None and self.kmeans is not None:
             # Prepare user profile for prediction
-            user_features = {
-                'income': user_profile['income'],
-                'housing_budget_preference': user_profile['housing_budget_preference'],
-                'requires_healthcare': user_profile['requires_healthcare'],
-                'transportation_preference': user_profile['transportation_preference'],
-                'safety_importance': user_profile['safety_importance']
-            }
-            
-            # Convert to DataFrame and one-hot encode
-            user_df = pd.DataFrame([user_features])
-            user_encoded = pd.get_dummies(user_df)
-            
-            # Ensure all columns from training are present
-            expected_columns = self.model.feature_names_in_
-            for col in expected_columns:
-                if col not in user_encoded.columns:
-                    user_encoded[col] = 0
-            
-            # Reorder columns to match training data
-            user_encoded = user_encoded[expected_columns]
+            user_features = {feature: user_profile[feature] for feature in USER_FEATURES}
             
             # Predict preferred cluster
-            preferred_cluster = self.model.predict(user_encoded)[0]
-            
-            # Get locations in preferred cluster
-            cluster_features = [
-                'affordability_score', 'safety_score', 'education_score', 
-                'healthcare_score', 'walkability_score', 'public_transit_score'
-            ]
-            
-            # Ensure all features exist
-            valid_features = [f for f in cluster_features if f in locations_df.columns]
+            preferred_cluster = self.preferred_clusters(pd.DataFrame([user_features]))[0]
             
-            # Predict clusters for all locations
-            locations_df['cluster'] = self.kmeans.predict(locations_df[valid_features])
-            
-            # Filter locations by preferred cluster
-            recommended_locations = locations_df[locations_df['cluster'] == preferred_cluster]
+            # Locations in the preferred cluster, from the saved cluster labels
+            partition = self.cluster_partitions(locations_df).get(int(preferred_cluster), [])
+            recommended_locations = locations_df.iloc[partition].assign(cluster=preferred_cluster)
             
             # Calculate match scores for recommended locations
-            match_scores = []
-            for _, location in recommended_locations.iterrows():
-                match_score = self.calculate_match_score(location, user_profile)
-                match_scores.append(match_score)
-            
-            recommended_locations['match_score'] = match_scores
+            recommended_locations['match_score'] = self.calculate_match_scores(recommended_locations, user_profile)
             
-            # Sort by match score
-            recommended_locations = recommended_locations.sort_values('match_score', ascending=False)
+            # Sort by match score; ties keep frame order, as in the batch top-k
+            recommended_locations = recommended_locations.sort_values('match_score', ascending=False, kind='stable')
             
             return recommended_locations
         else:
             # Fall back to rule-based recommendations
-            match_scores = []
-            for _, location in locations_df.iterrows():
-                match_score = self.calculate_match_score(location, user_profile)
-                match_scores.append(match_score)
-            
-            locations_df['match_score'] = match_scores
+            recommended_locations = locations_df.assign(
+                match_score=self.calculate_match_scores(locations_df, user_profile))
             
-            # Sort by match score
-            recommended_locations = locations_df.sort_values('match_score', ascending=False)
+            # Sort by match score; ties keep frame order, as in the batch top-k
+            recommended_locations = recommended_locations.sort_values('match_score', ascending=False, kind='stable')
             
             return recommended_locations
\ No newline at end of file
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from config import SQLITE_DB_PATH, LOCATION_FETCH_CHUNK_SIZE
+from data_utils import typed_location_frame, concat_location_frames, project_schema
+
+# Same tables as the PostgreSQL schema (supabase/migrations), limited to what
+# the ML scripts read and write
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+  id INTEGER PRIMARY KEY,
+  city TEXT NOT NULL,
+  state TEXT NOT NULL,
+  country TEXT NOT NULL,
+  latitude NUMERIC NOT NULL,
+  longitude NUMERIC NOT NULL,
+  affordability_score INTEGER NOT NULL,
+  cost_housing NUMERIC NOT NULL,
+  cost_food NUMERIC NOT NULL,
+  cost_transportation NUMERIC NOT NULL,
+  cost_healthcare NUMERIC NOT NULL,
+  cost_utilities NUMERIC NOT NULL,
+  safety_score INTEGER NOT NULL,
+  education_score INTEGER NOT NULL,
+  healthcare_score INTEGER NOT NULL,
+  environment_score INTEGER NOT NULL,
+  unemployment_rate NUMERIC NOT NULL,
+  median_income NUMERIC NOT NULL,
+  job_growth_rate NUMERIC NOT NULL,
+  walkability_score INTEGER NOT NULL,
+  public_transit_score INTEGER NOT NULL,
+  traffic_score INTEGER NOT NULL,
+  bike_score INTEGER NOT NULL,
+  review_count INTEGER NOT NULL DEFAULT 0,
+  overall_rating NUMERIC NOT NULL DEFAULT 0,
+  affordability_rating NUMERIC NOT NULL DEFAULT 0,
+  safety_rating NUMERIC NOT NULL DEFAULT 0,
+  transportation_rating NUMERIC NOT NULL DEFAULT 0,
+  amenities_rating NUMERIC NOT NULL DEFAULT 0,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_profiles (
+  id INTEGER PRIMARY KEY,
+  user_id INTEGER UNIQUE NOT NULL,
+  income NUMERIC NOT NULL,
+  savings NUMERIC NOT NULL,
+  household_size INTEGER NOT NULL DEFAULT 1,
+  housing_preference TEXT NOT NULL,
+  housing_budget_preference TEXT NOT NULL,
+  requires_healthcare BOOLEAN NOT NULL DEFAULT 0,
+  transportation_preference TEXT NOT NULL,
+  entertainment_importance TEXT NOT NULL,
+  needs_bike_lanes BOOLEAN NOT NULL DEFAULT 0,
+  safety_importance TEXT NOT NULL,
+  relocation_timeframe TEXT NOT NULL,
+  remote_work BOOLEAN NOT NULL DEFAULT 0,
+  languages JSON NOT NULL DEFAULT '[]',
+  amenities JSON NOT NULL DEFAULT '{}',
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_recommendations (
+  id INTEGER PRIMARY KEY,
+  user_id INTEGER NOT NULL,
+  location_id INTEGER NOT NULL,
+  affordability_score NUMERIC NOT NULL,
+  match_score NUMERIC NOT NULL,
+  created_at TIMESTAMP NOT NULL,
+  UNIQUE (user_id, location_id)
+);
+"""
+
+# SQLite declared types as the PostgreSQL types data_utils maps to dtypes
+POSTGRES_TYPES = {
+    'INTEGER': 'integer',
+    'NUMERIC': 'numeric',
+    'REAL': 'double precision',
+    'TEXT': 'text',
+    'BOOLEAN': 'boolean',
+    'TIMESTAMP': 'timestamp without time zone',
+    'JSON': 'json',
+}
+
+def _sql_value(value):
+    """Convert NumPy/pandas scalars and JSON values to types sqlite3 can bind"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+class SQLiteDataSource:
+    """
+    The same reads and writes as PostgresDataSource against a local SQLite
+    file, so the ML scripts and benchmarks run without a database server.
+    Tables are created on first use.
+    """
+
+    def __init__(self, path=SQLITE_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connection(self):
+        """A connection for one operation; commits on success, rolls back on error"""
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _schema(self, conn, table):
+        return [(row[1], POSTGRES_TYPES.get(row[2].upper(), 'text'))
+                for row in conn.execute(f"PRAGMA table_info({table})")]
+
+    def fetch_locations(self, use_cache=True, columns=None):
+        """Locations as a DataFrame in the same compact dtypes as PostgreSQL fetches"""
+        with self.connection() as conn:
+            schema = self._schema(conn, 'locations')
+            if columns is not None:
+                schema = project_schema(schema, columns)
+            names = ", ".join(f'"{name}"' for name, _ in schema)
+            cursor = conn.execute(f"SELECT {names} FROM locations ORDER BY id")
+            frames = []
+            while True:
+                rows = cursor.fetchmany(LOCATION_FETCH_CHUNK_SIZE)
+                if not rows:
+                    break
+                frames.append(typed_location_frame(rows, schema))
+        if not frames:
+            frames.append(typed_location_frame([], schema))
+        return concat_location_frames(frames)
+
+    def _profile(self, schema, row):
+        profile = {}
+        for (name, data_type), value in zip(schema, row):
+            if data_type == 'boolean':
+                value = bool(value)
+            elif data_type == 'json' and isinstance(value, str):
+                value = json.loads(value)
+            profile[name] = value
+        return profile
+
+    def fetch_user_profile(self, user_id):
+        with self.connection() as conn:
+            schema = self._schema(conn, 'user_profiles')
+            row = conn.execute("SELECT * FROM user_profiles WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        return self._profile(schema, row)
+
+    def fetch_user_profiles(self, user_ids=None):
+        """User profiles as a DataFrame ordered by user_id, optionally only `user_ids`"""
+        with self.connection() as conn:
+            schema = self._schema(conn, 'user_profiles')
+            if user_ids is None:
+                rows = conn.execute("SELECT * FROM user_profiles ORDER BY user_id").fetchall()
+            else:
+                # Through a temporary table rather than an IN list, which has a parameter limit
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS selected_users (user_id INTEGER PRIMARY KEY)")
+                conn.execute("DELETE FROM selected_users")
+                conn.executemany("INSERT OR IGNORE INTO selected_users VALUES (?)", ((int(uid),) for uid in user_ids))
+                rows = conn.execute("""
+                SELECT user_profiles.* FROM user_profiles
+                JOIN selected_users USING (user_id) ORDER BY user_id
+                """).fetchall()
+        return pd.DataFrame([self._profile(schema, row) for row in rows],
+                            columns=[name for name, _ in schema])
+
+    def fetch_recommendations(self, user_id):
+        with self.connection() as conn:
+            rows = conn.execute("""
+            SELECT location_id, affordability_score, match_score, created_at
+            FROM user_recommendations WHERE user_id = ?
+            ORDER BY match_score DESC, location_id
+            """, (user_id,)).fetchall()
+        return pd.DataFrame(rows, columns=['location_id', 'affordability_score', 'match_score', 'created_at'])
+
+    def save_predictions(self, rows, page_size=10000, replace_users=()):
+        """
+        Upsert {(user_id, location_id): (affordability_score, match_score)} in
+        one transaction, first deleting every stored row of `replace_users`
+        """
+        with self.connection() as conn:
+            conn.executemany("DELETE FROM user_recommendations WHERE user_id = ?",
+                             ((user_id,) for user_id in replace_users))
+            conn.executemany("""
+            INSERT INTO user_recommendations
+            (user_id, location_id, affordability_score, match_score, created_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id, location_id)
+            DO UPDATE SET
+                affordability_score = excluded.affordability_score,
+                match_score = excluded.match_score,
+                created_at = CURRENT_TIMESTAMP
+            """, [key + scores for key, scores in rows.items()])
+
+    def import_rows(self, table, df):
+        """Insert or replace a DataFrame's rows; columns must match the table's"""
+        columns = list(df.columns)
+        names = ", ".join(f'"{name}"' for name in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        rows = ([_sql_value(value) for value in row] for row in df.itertuples(index=False))
+        with self.connection() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO {table} ({names}) VALUES ({placeholders})", rows)
+
+def generate_synthetic_profiles(n_users=100):
+    """Generate synthetic user profiles covering every preference value"""
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'user_id': np.arange(1, n_users + 1),
+        'income': rng.uniform(25000, 250000, n_users).round(2),
+        'savings': rng.uniform(0, 100000, n_users).round(2),
+        'household_size': rng.integers(1, 6, n_users),
+        'housing_preference': rng.choice(['rent', 'buy', 'either'], n_users),
+        'housing_budget_preference': rng.choice(['less-than-30', '30-40', '40-plus'], n_users),
+        'requires_healthcare': rng.choice([True, False], n_users),
+        'transportation_preference': rng.choice(['car', 'public-transit', 'bike-walking'], n_users),
+        'entertainment_importance': rng.choice(['very-important', 'somewhat-important', 'not-important'], n_users),
+        'needs_bike_lanes': rng.choice([True, False], n_users),
+        'safety_importance': rng.choice(['very-important', 'somewhat-important', 'not-important'], n_users),
+        'relocation_timeframe': rng.choice(['ASAP', '3-6 months', '6-12 months', '1+ year', 'Just exploring'], n_users),
+        'remote_work': rng.choice([True, False], n_users),
+    })
+
+def main():
+    """Create a local SQLite database seeded with synthetic locations and users"""
+    from train_models import generate_synthetic_data
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--path', default=SQLITE_DB_PATH)
+    parser.add_argument('--locations', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=100)
+    args = parser.parse_args()
+
+    source = SQLiteDataSource(args.path)
+    source.import_rows('locations', generate_synthetic_data(args.locations))
+    source.import_rows('user_profiles', generate_synthetic_profiles(args.users))
+    print(f"Seeded {args.path} with {args.locations} locations and {args.users} user profiles")
+    print(f"Use it with ML_DATA_SOURCE=sqlite SQLITE_DB_PATH={args.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+# rental_index.py
+import json
+import re
+from array import array
+from bisect import bisect_left
+import numpy as np
+
+PRICE_NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+# Amenities the questionnaire asks about, with the words that indicate them in
+# a listing's text. Each amenity is one bit of a listing's amenity_flags.
+AMENITY_PATTERNS = {
+    'parks': re.compile(r'\b(parks?|trails?|green ?space)\b'),
+    'gyms': re.compile(r'\b(gym|fitness)\b'),
+    'shopping': re.compile(r'\b(shopping|mall|shops|retail)\b'),
+    'restaurants': re.compile(r'\b(restaurants?|caf[eé]s?|dining)\b'),
+    'schools': re.compile(r'\b(schools?)\b'),
+}
+AMENITY_BITS = {name: 1 << bit for bit, name in enumerate(AMENITY_PATTERNS)}
+AMENITY_TEXT_FIELDS = ['amenities', 'buildingName', 'statusText', 'description']
+
+EARTH_RADIUS_KM = 6371.0088
+# Side of a geo grid cell in degrees (about 11 km of latitude)
+GEO_CELL_DEGREES = 0.1
+GEO_COLUMNS = int(round(360 / GEO_CELL_DEGREES))
+GEO_ROWS = int(round(180 / GEO_CELL_DEGREES))
+
+def parse_price(price):
+    """
+    Parse a unit price such as "$2,750", "$2,750+" or "$1,500 - $2,000".
+    Returns (low, high) or None when no amount can be found.
+    """
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return float(price), float(price)
+    if not isinstance(price, str):
+        return None
+    amounts = [float(match.replace(',', '')) for match in PRICE_NUMBER.findall(price)]
+    if not amounts:
+        return None
+    return min(amounts), max(amounts)
+
+def parse_beds(beds):
+    """Parse a unit's bedroom count ("2", "Studio"); NaN when unknown"""
+    if isinstance(beds, (int, float)) and not isinstance(beds, bool):
+        return float(beds)
+    if not isinstance(beds, str):
+        return np.nan
+    if beds.strip().lower() == 'studio':
+        return 0.0
+    match = PRICE_NUMBER.search(beds)
+    return float(match.group().replace(',', '')) if match else np.nan
+
+def _coordinate(rental, name):
+    value = (rental.get('latLong') or {}).get(name)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+def amenity_flags(rental):
+    """Bitmask of the amenities mentioned in a listing's text fields"""
+    text = ' '.join(str(rental.get(field) or '') for field in AMENITY_TEXT_FIELDS).lower()
+    flags = 0
+    for name, pattern in AMENITY_PATTERNS.items():
+        if pattern.search(text):
+            flags |= AMENITY_BITS[name]
+    return flags
+
+def _reduce_units(ufunc, values, offsets, empty):
+    """Reduce a flat unit column to one value per listing, ignoring NaNs"""
+    result = np.full(len(offsets) - 1, empty, dtype=np.float64)
+    has_units = np.diff(offsets) > 0
+    if values.size:
+        reduced = ufunc.reduceat(values, offsets[:-1][has_units])
+        result[has_units] = np.where(np.isnan(reduced), empty, reduced)
+    return result
+
+class ColumnBuilder:
+    """
+    Accumulates the columns RentalIndex needs one listing at a time, so they
+    can be built from an in-memory list or while streaming a file.
+
+    Every unit's price and beds are parsed once. Units are stored flat with
+    per-listing offsets (listing i owns units offsets[i]:offsets[i + 1]), and
+    per-listing min/max columns make budget filtering a vector mask. States
+    and lowercased city names are interned into small string tables.
+    """
+
+    def __init__(self):
+        self.states = []
+        self.cities = []
+        self._state_ids = {}
+        self._city_ids = {}
+        self.state_ids = array('i')
+        self.city_ids = array('i')
+        self.latitude = array('d')
+        self.longitude = array('d')
+        self.amenity_flags = array('B')
+        self.unit_offsets = array('q', [0])
+        self.unit_price_low = array('d')
+        self.unit_price_high = array('d')
+        self.unit_beds = array('d')
+        self.unparsed_prices = 0
+
+    def _intern(self, value, table, ids):
+        if value not in ids:
+            ids[value] = len(table)
+            table.append(value)
+        return ids[value]
+
+    def add(self, rental):
+        self.state_ids.append(self._intern(rental.get('addressState', ''), self.states, self._state_ids))
+        city_key = (rental.get('addressCity') or '').lower()
+        self.city_ids.append(self._intern(city_key, self.cities, self._city_ids))
+        self.latitude.append(_coordinate(rental, 'latitude'))
+        self.longitude.append(_coordinate(rental, 'longitude'))
+        self.amenity_flags.append(amenity_flags(rental))
+
+        for unit in rental.get('units') or []:
+            parsed = parse_price(unit.get('price', ''))
+            if parsed is None:
+                self.unparsed_prices += 1
+                parsed = (np.nan, np.nan)
+            self.unit_price_low.append(parsed[0])
+            self.unit_price_high.append(parsed[1])
+            self.unit_beds.append(parse_beds(unit.get('beds')))
+        self.unit_offsets.append(len(self.unit_price_low))
+
+    def finish(self):
+        """Return the columns as NumPy arrays plus the string tables"""
+        columns = {
+            'state_ids': np.array(self.state_ids, dtype=np.int32),
+            'city_ids': np.array(self.city_ids, dtype=np.int32),
+            'latitude': np.array(self.latitude, dtype=np.float64),
+            'longitude': np.array(self.longitude, dtype=np.float64),
+            'amenity_flags': np.array(self.amenity_flags, dtype=np.uint8),
+            'unit_offsets': np.array(self.unit_offsets, dtype=np.int64),
+            'unit_price_low': np.array(self.unit_price_low, dtype=np.float64),
+            'unit_price_high': np.array(self.unit_price_high, dtype=np.float64),
+            'unit_beds': np.array(self.unit_beds, dtype=np.float64),
+        }
+        offsets = columns['unit_offsets']
+        columns['min_price'] = _reduce_units(np.fmin, columns['unit_price_low'], offsets, np.inf)
+        columns['max_price'] = _reduce_units(np.fmax, columns['unit_price_high'], offsets, -np.inf)
+        columns['min_beds'] = _reduce_units(np.fmin, columns['unit_beds'], offsets, np.nan)
+        columns['max_beds'] = _reduce_units(np.fmax, columns['unit_beds'], offsets, np.nan)
+        return columns, {'states': self.states, 'cities': self.cities}
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from one point to arrays of points"""
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = (np.sin((lats - lat) / 2) ** 2
+         + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def _geo_cells(lats, lons):
+    rows = np.floor((np.clip(lats, -90, 90) + 90) / GEO_CELL_DEGREES).astype(np.int64)
+    cols = np.floor((np.clip(lons, -180, 180) + 180) / GEO_CELL_DEGREES).astype(np.int64)
+    return np.clip(rows, 0, GEO_ROWS - 1), np.clip(cols, 0, GEO_COLUMNS - 1)
+
+def _group_positions(ids, positions=None):
+    """Split positions by id, keeping each group in position order: {id: positions}"""
+    if positions is None:
+        positions = np.arange(len(ids), dtype=np.int64)
+    if not len(positions):
+        return {}
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    bounds = np.flatnonzero(np.diff(sorted_ids)) + 1
+    starts = np.concatenate(([0], bounds))
+    groups = np.split(positions[order], bounds)
+    return {int(sorted_ids[start]): group for start, group in zip(starts, groups)}
+
+class RentalIndex:
+    """
+    State -> city -> listing index over the Zillow rentals.
+    Positions always refer to the listing's place in the source list, so
+    lookups return listings in the same order as a full scan would.
+    `version` identifies the dataset the index was built from.
+
+    `rentals` is any sequence of listing dicts: a list parsed from JSON, a
+    memory-mapped RentalSnapshot or a RentalFile, the last two decoding
+    listings on access.
+    """
+
+    def __init__(self, rentals, version='0', columns=None, tables=None):
+        self.rentals = rentals
+        self.version = version
+
+        if columns is None:
+            builder = ColumnBuilder()
+            for rental in rentals:
+                builder.add(rental)
+            if builder.unparsed_prices:
+                print(f"Skipped {builder.unparsed_prices} unit prices that could not be parsed")
+            columns, tables = builder.finish()
+
+        for name, values in columns.items():
+            setattr(self, name, values)
+        if 'amenity_flags' not in columns:
+            # Snapshots compiled before amenity flags existed
+            self.amenity_flags = np.zeros(len(rentals), dtype=np.uint8)
+        self.states = tables['states']
+        self.cities = tables['cities']
+
+        # state -> {lowercased city -> sorted positions}
+        self.state_positions = {}
+        self.by_state = {}
+        for state_id, positions in _group_positions(self.state_ids).items():
+            state = self.states[state_id]
+            self.state_positions[state] = positions
+            self.by_state[state] = {
+                self.cities[city_id]: city_positions
+                for city_id, city_positions in _group_positions(self.city_ids[positions], positions).items()
+            }
+        self.by_city = {
+            self.cities[city_id]: positions
+            for city_id, positions in _group_positions(self.city_ids).items()
+        }
+
+        self._build_geo_index()
+
+        # Every suffix of every distinct city name, sorted. A substring query is
+        # a prefix search over these suffixes, so partial matches like "san"
+        # only touch the city names that contain it.
+        suffixes = set()
+        for key in self.by_city:
+            for i in range(len(key)):
+                suffixes.add((key[i:], key))
+        self.city_suffixes = sorted(suffixes)
+
+    def _build_geo_index(self):
+        """
+        Bucket listings with coordinates into a lat/long grid. Cells are
+        numbered row-major and listings sorted by cell, so the cells of one
+        grid row that a query box covers form one contiguous slice.
+        """
+        located = np.flatnonzero(~np.isnan(self.latitude) & ~np.isnan(self.longitude))
+        rows, cols = _geo_cells(self.latitude[located], self.longitude[located])
+        cells = rows * GEO_COLUMNS + cols
+        order = np.argsort(cells, kind='stable')
+        self.geo_cells = cells[order]
+        self.geo_positions = located[order]
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Positions (in dataset order) of listings inside a lat/long box. The
+        box is clipped to the grid, so at most every grid row is scanned.
+        """
+        bounds = np.array([min_lat, min_lon, max_lat, max_lon], dtype=np.float64)
+        if not np.isfinite(bounds).all() or min_lat > max_lat or min_lon > max_lon:
+            return np.array([], dtype=np.int64)
+        (row_lo, row_hi), (col_lo, col_hi) = _geo_cells(np.array([min_lat, max_lat]),
+                                                         np.array([min_lon, max_lon]))
+        rows = np.arange(row_lo, row_hi + 1, dtype=np.int64) * GEO_COLUMNS
+        starts = np.searchsorted(self.geo_cells, rows + col_lo, side='left')
+        ends = np.searchsorted(self.geo_cells, rows + col_hi, side='right')
+        slices = [self.geo_positions[start:end] for start, end in zip(starts, ends) if end > start]
+        if not slices:
+            return np.array([], dtype=np.int64)
+        candidates = np.sort(np.concatenate(slices))
+        lats = self.latitude[candidates]
+        lons = self.longitude[candidates]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        return candidates[inside]
+
+    def nearby(self, lat, lon, radius_km):
+        """
+        Positions (in dataset order) and distances of listings within
+        radius_km. Searches that cross the antimeridian wrap around to the
+        other side of the map.
+        """
+        lat_delta = np.degrees(radius_km / EARTH_RADIUS_KM)
+        cos_lat = np.cos(np.radians(lat))
+        lon_delta = 180.0 if cos_lat < 1e-6 else min(180.0, lat_delta / cos_lat)
+        min_lat, max_lat = max(-90.0, lat - lat_delta), min(90.0, lat + lat_delta)
+        west, east = lon - lon_delta, lon + lon_delta
+        if lon_delta >= 180.0:
+            spans = [(-180.0, 180.0)]
+        elif west < -180.0:
+            spans = [(-180.0, east), (west + 360.0, 180.0)]
+        elif east > 180.0:
+            spans = [(west, 180.0), (-180.0, east - 360.0)]
+        else:
+            spans = [(west, east)]
+        candidates = np.unique(np.concatenate(
+            [self.within_bbox(min_lat, min_lon, max_lat, max_lon) for min_lon, max_lon in spans]))
+        distances = haversine_km(lat, lon, self.latitude[candidates], self.longitude[candidates])
+        inside = distances <= radius_km
+        return candidates[inside], distances[inside]
+
+    @classmethod
+    def from_snapshot(cls, snapshot, version='0'):
+        """Build the index straight from a RentalSnapshot's or RentalFile's columns"""
+        return cls(snapshot, version=version, columns=snapshot.columns, tables=snapshot.tables)
+
+    def match_cities(self, city):
+        """Return the set of lowercased city names containing `city`"""
+        query = city.lower()
+        matches = set()
+        i = bisect_left(self.city_suffixes, (query,))
+        while i < len(self.city_suffixes) and self.city_suffixes[i][0].startswith(query):
+            matches.add(self.city_suffixes[i][1])
+            i += 1
+        return matches
+
+    def lookup(self, city=None, state=None):
+        """Return positions of listings matching city (substring) and state (exact)"""
+        if state:
+            state = state.upper()
+            if not city:
+                return self.state_positions.get(state, np.array([], dtype=np.int64))
+            cities = self.by_state.get(state, {})
+        else:
+            if not city:
+                return np.arange(len(self.rentals), dtype=np.int64)
+            cities = self.by_city
+
+        groups = [cities[key] for key in self.match_cities(city) if key in cities]
+        if not groups:
+            return np.array([], dtype=np.int64)
+        if len(groups) == 1:
+            return groups[0]
+        return np.sort(np.concatenate(groups))
+
+    def affordable(self, positions, monthly_budget):
+        """Keep positions with at least one unit priced within the budget"""
+        return positions[self.min_price[positions] <= monthly_budget]
+
+    def listings(self, positions):
+        """Materialize listings for a sequence of positions"""
+        return [self.rentals[pos] for pos in positions]
+
+    def encode_listings(self, positions):
+        """
+        Each listing serialized exactly as json.dumps would, so responses can
+        be assembled from them. Snapshots hand back their stored bytes.
+        """
+        raw = getattr(self.rentals, 'raw', None)
+        if raw is not None:
+            return [raw(pos) for pos in positions]
+        return [json.dumps(self.rentals[pos]).encode() for pos in positions]
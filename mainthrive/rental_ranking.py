@@ -0,0 +1,110 @@
+# rental_ranking.py
+import math
+import numpy as np
+from rental_index import AMENITY_BITS, haversine_km
+
+# How much each criterion contributes to a listing's ranking score (0-1 each)
+RANKING_WEIGHTS = {
+    'budget': 0.4,
+    'beds': 0.3,
+    'amenities': 0.2,
+    'transportation': 0.1,
+}
+
+# Transportation preferences that favour listings near the middle of a market
+CENTRAL_PREFERENCES = ('public-transit', 'bike-walking')
+
+# Set bits in every uint8 value, for counting matched amenities
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.float64)
+
+def desired_beds(household_size):
+    """Bedrooms a household wants: one per two people, at least one"""
+    return max(1, math.ceil(household_size / 2))
+
+def requested_amenities(amenities):
+    """Bitmask of the amenities a request marks as wanted"""
+    if not isinstance(amenities, dict):
+        return 0
+    return sum(bit for name, bit in AMENITY_BITS.items() if amenities.get(name))
+
+class MarketCandidates:
+    """
+    The listing columns of one or more markets, gathered once into shared
+    arrays so every profile ranked against them is scored in a single pass.
+    `markets` is a list of position arrays, one per market.
+    """
+
+    def __init__(self, index, markets):
+        self.bounds = np.cumsum([0] + [len(positions) for positions in markets])
+        self.positions = (np.concatenate(markets) if markets
+                          else np.array([], dtype=np.int64)).astype(np.int64, copy=False)
+        self.min_price = index.min_price[self.positions]
+        self.max_beds = index.max_beds[self.positions]
+        self.amenity_flags = index.amenity_flags[self.positions]
+
+        # Centrality: 1 at a market's centre, 0 at its farthest listing
+        lats = index.latitude[self.positions]
+        lons = index.longitude[self.positions]
+        self.centrality = np.full(len(self.positions), 0.5)
+        for start, end in zip(self.bounds[:-1], self.bounds[1:]):
+            located = np.flatnonzero(~np.isnan(lats[start:end]) & ~np.isnan(lons[start:end])) + start
+            if not len(located):
+                continue
+            distances = haversine_km(lats[located].mean(), lons[located].mean(),
+                                     lats[located], lons[located])
+            farthest = distances.max()
+            self.centrality[located] = 1 - distances / farthest if farthest > 0 else 1.0
+
+    def rank(self, profile, limit, offset=0):
+        """
+        Score the listings affordable for `profile` and return, for each
+        market, (number affordable, positions of the best `limit` after
+        skipping `offset`). Ties keep dataset order.
+        """
+        empty = self.positions[:0]
+        budget = profile['monthly_budget']
+        if budget <= 0:
+            return [(0, empty)] * (len(self.bounds) - 1)
+        affordable = np.flatnonzero(self.min_price <= budget)
+
+        budget_score = 1 - self.min_price[affordable] / budget
+
+        beds = self.max_beds[affordable]
+        beds_score = np.where(np.isnan(beds), 0.5,
+                              np.clip(beds / desired_beds(profile['household_size']), 0, 1))
+
+        wanted = requested_amenities(profile['amenities'])
+        if wanted:
+            amenity_score = POPCOUNT[self.amenity_flags[affordable] & wanted] / POPCOUNT[wanted]
+        else:
+            amenity_score = 0.0
+
+        if profile['transportation_preference'] in CENTRAL_PREFERENCES:
+            transportation_score = self.centrality[affordable]
+        else:
+            transportation_score = 0.0
+
+        scores = (RANKING_WEIGHTS['budget'] * budget_score
+                  + RANKING_WEIGHTS['beds'] * beds_score
+                  + RANKING_WEIGHTS['amenities'] * amenity_score
+                  + RANKING_WEIGHTS['transportation'] * transportation_score)
+
+        ranked = []
+        splits = np.searchsorted(affordable, self.bounds)
+        for start, end in zip(splits[:-1], splits[1:]):
+            ranked.append((int(end - start), self._top(affordable[start:end], scores[start:end],
+                                                       limit, offset)))
+        return ranked
+
+    def _top(self, affordable, scores, limit, offset):
+        """Positions of the best `limit` after `offset` by descending score"""
+        # Only the best offset + limit (and anything tied with the last of
+        # them) need ordering
+        wanted_count = offset + limit
+        if wanted_count < len(affordable):
+            cutoff = np.partition(-scores, wanted_count - 1)[wanted_count - 1]
+            best = np.flatnonzero(-scores <= cutoff)
+        else:
+            best = np.arange(len(affordable))
+        order = np.lexsort((affordable[best], -scores[best]))
+        return self.positions[affordable[best[order]]][offset:offset + limit]
@@ -0,0 +1,133 @@
+# rental_snapshot.py
+"""
+Compact binary snapshot of the Zillow rentals, compiled by load_zillow_data.py
+and memory-mapped by app.py at startup.
+
+Layout: an 8-byte magic, the header length (uint64, little-endian), a JSON
+header, then 64-byte aligned sections. The header records each numeric
+column's dtype/count/offset, the interned state and city string tables, and
+where the records blob starts. The records blob holds each listing exactly as
+json.dumps serializes it, addressed through the `record_offsets` column, so
+the server can answer with the stored bytes without decoding them.
+"""
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+import numpy as np
+from rental_index import ColumnBuilder
+
+MAGIC = b'THRVRNT1'
+ALIGNMENT = 64
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+class SnapshotWriter:
+    """Writes listings into a snapshot one at a time; call close() to finish"""
+
+    def __init__(self, path):
+        self.path = path
+        self.builder = ColumnBuilder()
+        self.records = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+        self.record_offsets = array('q', [0])
+
+    def add(self, rental):
+        record = json.dumps(rental).encode()
+        self.records.write(record)
+        self.record_offsets.append(self.record_offsets[-1] + len(record))
+        self.builder.add(rental)
+
+    def close(self):
+        """Write the snapshot to a temporary file and atomically move it into place"""
+        columns, tables = self.builder.finish()
+        columns['record_offsets'] = np.array(self.record_offsets, dtype=np.int64)
+
+        layout = {}
+        offset = 0
+        for name, values in columns.items():
+            layout[name] = {'dtype': values.dtype.str, 'count': len(values), 'offset': offset}
+            offset = _align(offset + values.nbytes)
+        header = json.dumps({
+            'count': len(self.record_offsets) - 1,
+            'columns': layout,
+            'tables': tables,
+            'records': {'offset': offset, 'size': self.record_offsets[-1]},
+        }).encode()
+        data_start = _align(len(MAGIC) + 8 + len(header))
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            out.write(MAGIC)
+            out.write(struct.pack('<Q', len(header)))
+            out.write(header)
+            for name, values in columns.items():
+                out.write(b'\0' * (data_start + layout[name]['offset'] - out.tell()))
+                out.write(values.tobytes())
+            out.write(b'\0' * (data_start + offset - out.tell()))
+            self.records.seek(0)
+            shutil.copyfileobj(self.records, out, 1024 * 1024)
+        self.records.close()
+        os.replace(tmp_path, self.path)
+        return len(self.record_offsets) - 1
+
+    def discard(self):
+        """Drop a snapshot that will not be finished, including any partial temporary file"""
+        self.records.close()
+        if os.path.exists(self.path + '.tmp'):
+            os.remove(self.path + '.tmp')
+
+def write_snapshot(rentals, path):
+    """Compile an iterable of listings into a snapshot; returns the listing count"""
+    writer = SnapshotWriter(path)
+    for rental in rentals:
+        writer.add(rental)
+    return writer.close()
+
+class RentalSnapshot:
+    """
+    Read-only, memory-mapped snapshot. Columns are NumPy views straight onto
+    the mapped file, so they cost no heap and every process mapping the same
+    snapshot shares the pages. Listings decode lazily on access.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a rental snapshot")
+        header_length = struct.unpack_from('<Q', self.mm, len(MAGIC))[0]
+        header_start = len(MAGIC) + 8
+        header = json.loads(self.mm[header_start:header_start + header_length])
+        data_start = _align(header_start + header_length)
+
+        self.columns = {}
+        for name, spec in header['columns'].items():
+            dtype = np.dtype(spec['dtype'])
+            if spec['count']:
+                self.columns[name] = np.frombuffer(self.mm, dtype=dtype, count=spec['count'],
+                                                   offset=data_start + spec['offset'])
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+        self.record_offsets = self.columns.pop('record_offsets')
+        self.records_start = data_start + header['records']['offset']
+        self.tables = header['tables']
+
+    def __len__(self):
+        return len(self.record_offsets) - 1
+
+    def raw(self, pos):
+        """The listing's JSON bytes, exactly as json.dumps produced them"""
+        start = self.records_start + int(self.record_offsets[pos])
+        end = self.records_start + int(self.record_offsets[pos + 1])
+        return self.mm[start:end]
+
+    def __getitem__(self, pos):
+        return json.loads(self.raw(pos))
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
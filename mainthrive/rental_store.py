@@ -0,0 +1,96 @@
+# rental_store.py
+"""
+Lean in-memory view of the rentals JSON file, used by app.py when no current
+snapshot exists.
+
+Only the columns RentalIndex needs (typed arrays, with states and cities
+interned into string tables) and each listing's byte offset in the file stay
+in memory. Listings are read back from the file by offset when a response
+needs them, instead of keeping every one as a nested dict.
+"""
+import json
+import os
+from array import array
+from rental_index import ColumnBuilder
+from load_zillow_data import iter_json_array
+
+class StaleRentalFileError(OSError):
+    """The rentals file was modified in place after it was indexed"""
+
+class RentalFile:
+    """
+    Read-only listings backed by a JSON array file, with the same interface
+    as RentalSnapshot: `columns`, `tables`, raw(pos), indexing and len().
+
+    raw(pos) must return exactly what json.dumps(listing) produces. That is
+    the file's own text for files written with json.dump (the sample data
+    and load_zillow_data.py); listings stored any other way, e.g. indented,
+    keep their re-serialized bytes in memory instead.
+
+    Listings are read through the descriptor opened at load, so replacing
+    the file (as load_zillow_data.py does) is harmless. A file rewritten in
+    place would hand back the wrong bytes, so reads verify the descriptor's
+    inode, size and mtime and raise StaleRentalFileError if they changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        self.identity = self._identity()
+        self.starts = array('q')
+        self.lengths = array('q')
+        # pos -> json.dumps bytes for listings whose file text differs
+        self.reserialized = {}
+
+        builder = ColumnBuilder()
+        # Latin-1 maps every byte to one character, so character offsets
+        # from the parser are byte offsets into the file
+        with open(self.fd, 'r', encoding='latin-1', closefd=False) as f:
+            for rental, start, text in iter_json_array(f, with_text=True):
+                source = text.encode('latin-1')
+                if not source.isascii():
+                    rental = json.loads(source)
+                builder.add(rental)
+                record = json.dumps(rental).encode()
+                if record != source:
+                    self.reserialized[len(self.starts)] = record
+                self.starts.append(start)
+                self.lengths.append(len(source))
+        self.check()
+        self.columns, self.tables = builder.finish()
+        self.unparsed_prices = builder.unparsed_prices
+
+    def _identity(self):
+        stat = os.fstat(self.fd)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def check(self):
+        """Raise StaleRentalFileError if the file changed since it was indexed"""
+        if self._identity() != self.identity:
+            raise StaleRentalFileError(f"{self.path} changed after it was loaded")
+
+    def __del__(self):
+        try:
+            os.close(self.fd)
+        except (AttributeError, OSError):
+            pass
+
+    def __len__(self):
+        return len(self.starts)
+
+    def raw(self, pos):
+        """The listing's JSON bytes, exactly as json.dumps produced them"""
+        record = self.reserialized.get(pos)
+        if record is not None:
+            return record
+        record = os.pread(self.fd, self.lengths[pos], self.starts[pos])
+        # Checked after reading, so a write that raced the read is caught too
+        self.check()
+        return record
+
+    def __getitem__(self, pos):
+        return json.loads(self.raw(pos))
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
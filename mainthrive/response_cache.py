@@ -0,0 +1,94 @@
+# response_cache.py
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Bodies smaller than this aren't worth compressing
+MIN_GZIP_SIZE = 1024
+
+class CachedResponse:
+    """A serialized response body with its ETag and lazily built gzip variant"""
+
+    __slots__ = ('body', 'etag', '_gzipped', '_lock')
+
+    def __init__(self, body, version):
+        self.body = body
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.etag = f'"{version}-{digest}"'
+        self._gzipped = None
+        self._lock = threading.Lock()
+
+    @property
+    def gzip_etag(self):
+        return self.etag[:-1] + '-gzip"'
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header value names this response"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        if '*' in tags:
+            return True
+        tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+        return self.etag in tags or self.gzip_etag in tags
+
+    def wants_gzip(self, accept_encoding):
+        return len(self.body) >= MIN_GZIP_SIZE and 'gzip' in (accept_encoding or '')
+
+    def etag_for(self, accept_encoding):
+        return self.gzip_etag if self.wants_gzip(accept_encoding) else self.etag
+
+    def encoded(self, accept_encoding):
+        """Return (body, extra headers), gzipped once if the client accepts it"""
+        if not self.wants_gzip(accept_encoding):
+            return self.body, [('ETag', self.etag)]
+        with self._lock:
+            if self._gzipped is None:
+                self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped, [
+            ('ETag', self.gzip_etag),
+            ('Content-Encoding', 'gzip'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+
+class ResponseCache:
+    """
+    Bounded LRU cache of serialized responses keyed by (data version, key).
+    Bounded both by entry count and by total body bytes.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, version, key):
+        with self.lock:
+            entry = self.entries.get((version, key))
+            if entry is not None:
+                self.entries.move_to_end((version, key))
+            return entry
+
+    def put(self, version, key, body):
+        entry = CachedResponse(body, version)
+        if self.max_entries <= 0 or len(body) > self.max_bytes:
+            return entry
+        with self.lock:
+            previous = self.entries.pop((version, key), None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self.entries[(version, key)] = entry
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.body)
+        return entry
+
+    def invalidate(self):
+        """Drop every cached response, e.g. after the rental dataset changes"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
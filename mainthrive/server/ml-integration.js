@@ -5,9 +5,86 @@ import fs from 'fs';
 
 // Get current directory
 const __filename = fileURLToPath(import.meta.url);
-const __dirname = dirname(__filename);
+const __dirname = path.dirname(__filename);
 const ML_DIR = path.join(__dirname, '..', 'ml');
 
+// How long a request may wait for the prediction worker, including the
+// worker loading models and locations on its first request
+const WORKER_TIMEOUT_MS = 120000;
+
+/**
+ * One long-lived `predict.py serve` process, started on first use. It keeps
+ * the models and location data loaded, so requests skip interpreter startup
+ * and model loading. Requests and responses are JSON lines matched by id, so
+ * several requests can be in flight at once. If the process exits, pending
+ * requests fail and the next request starts a new one.
+ */
+const PredictionWorker = {
+  shell: null,
+  nextId: 1,
+  pending: new Map(),
+
+  start() {
+    const options = {
+      mode: 'json',
+      pythonPath: 'python', // or 'python3' depending on your environment
+      pythonOptions: ['-u'], // unbuffered output
+      scriptPath: ML_DIR,
+      args: ['serve']
+    };
+
+    const shell = new PythonShell('predict.py', options);
+    shell.on('message', message => {
+      const request = this.pending.get(message.id);
+      if (!request) {
+        return; // e.g. the {"ready": true} line
+      }
+      this.pending.delete(message.id);
+      clearTimeout(request.timer);
+      if (message.error) {
+        request.reject({ error: message.error });
+      } else {
+        request.resolve(message.result);
+      }
+    });
+    shell.on('stderr', line => console.error(`Prediction worker: ${line}`));
+    shell.on('close', () => this.stopped(shell, 'Prediction worker exited'));
+    shell.on('error', err => this.stopped(shell, err.message));
+    this.shell = shell;
+  },
+
+  stopped(shell, reason) {
+    if (this.shell === shell) {
+      this.shell = null;
+    }
+    for (const [id, request] of this.pending) {
+      clearTimeout(request.timer);
+      request.reject({ error: reason });
+      this.pending.delete(id);
+    }
+  },
+
+  /**
+   * Send one request to the worker
+   * @param {object} request - Command and its arguments
+   * @returns {Promise<object>} The worker's result
+   */
+  request(request) {
+    if (!this.shell) {
+      this.start();
+    }
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject({ error: 'Prediction worker timed out' });
+      }, WORKER_TIMEOUT_MS);
+      this.pending.set(id, { resolve, reject, timer });
+      this.shell.send({ id, ...request });
+    });
+  }
+};
+
 /**
  * ML Integration Service for Thrive app
  */
@@ -54,6 +131,8 @@ const MLService = {
       PythonShell.run('train_models.py', options)
         .then(results => {
           console.log('Model training completed');
+          // Let a running prediction worker pick up the new models
+          this.reloadModels().catch(err => console.error('Error reloading models:', err));
           resolve({ success: true, output: results.join('\n') });
         })
         .catch(err => {
@@ -69,28 +148,12 @@ const MLService = {
    * @returns {Promise<object>} Prediction results
    */
   async predictAffordability(locationId) {
-    return new Promise((resolve, reject) => {
-      const options = {
-        mode: 'json',
-        pythonPath: 'python', // or 'python3' depending on your environment
-        pythonOptions: ['-u'], // unbuffered output
-        scriptPath: ML_DIR,
-        args: ['affordability', locationId.toString()]
-      };
-      
-      PythonShell.run('predict.py', options)
-        .then(results => {
-          if (results && results.length > 0) {
-            resolve(results[0]);
-          } else {
-            reject({ error: 'No prediction results returned' });
-          }
-        })
-        .catch(err => {
-          console.error('Error predicting affordability:', err);
-          reject({ error: err.message });
-        });
-    });
+    try {
+      return await PredictionWorker.request({ command: 'affordability', location_id: Number(locationId) });
+    } catch (err) {
+      console.error('Error predicting affordability:', err);
+      throw err;
+    }
   },
   
   /**
@@ -99,28 +162,23 @@ const MLService = {
    * @returns {Promise<object>} Recommendation results
    */
   async generateRecommendations(userId) {
-    return new Promise((resolve, reject) => {
-      const options = {
-        mode: 'json',
-        pythonPath: 'python', // or 'python3' depending on your environment
-        pythonOptions: ['-u'], // unbuffered output
-        scriptPath: ML_DIR,
-        args: ['recommendations', userId.toString()]
-      };
-      
-      PythonShell.run('predict.py', options)
-        .then(results => {
-          if (results && results.length > 0) {
-            resolve(results[0]);
-          } else {
-            reject({ error: 'No recommendation results returned' });
-          }
-        })
-        .catch(err => {
-          console.error('Error generating recommendations:', err);
-          reject({ error: err.message });
-        });
-    });
+    try {
+      return await PredictionWorker.request({ command: 'recommendations', user_id: Number(userId) });
+    } catch (err) {
+      console.error('Error generating recommendations:', err);
+      throw err;
+    }
+  },
+  
+  /**
+   * Reload models and location data in the prediction worker, if running
+   * @returns {Promise<object>} Reload results
+   */
+  async reloadModels() {
+    if (!PredictionWorker.shell) {
+      return { reloaded: false };
+    }
+    return PredictionWorker.request({ command: 'reload' });
   }
 };
 
@@ -0,0 +1,64 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The rental API modules live at the root; the ml scripts import each other from ml/
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "ml"))
+
+
+@pytest.fixture(scope="session")
+def make_listing():
+    """Factory for listings with every field load_zillow_data requires"""
+    def make(zpid, city="Austin", state="TX", lat=None, lng=None, price="$1,000", beds="1", **fields):
+        listing = {"zpid": str(zpid), "id": str(zpid), "address": f"{zpid} Main St, {city}, {state}",
+                   "addressCity": city, "addressState": state,
+                   "units": [{"price": price, "beds": beds}]}
+        if lat is not None:
+            listing["latLong"] = {"latitude": lat, "longitude": lng}
+        listing.update(fields)
+        return listing
+    return make
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    # app loads (and if missing creates) zillow_rentals.json in the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("rentals"))
+    try:
+        yield importlib.import_module("app")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    """Point the ml models' save and load paths at a temporary directory"""
+    import affordability_model
+    import recommendation_model
+    for module, name in [(affordability_model, "AFFORDABILITY_MODEL_PATH"),
+                         (affordability_model, "PREPROCESSOR_PATH"),
+                         (recommendation_model, "RECOMMENDATION_MODEL_PATH"),
+                         (recommendation_model, "CLUSTER_INDEX_PATH")]:
+        monkeypatch.setattr(module, name, str(tmp_path / os.path.basename(getattr(module, name))))
+    return tmp_path
+
+
+@pytest.fixture
+def sqlite_source(tmp_path):
+    """A SQLite data source seeded with synthetic locations and users, used by the ml functions"""
+    import data_utils
+    from sqlite_source import SQLiteDataSource, generate_synthetic_profiles
+    from train_models import generate_synthetic_data
+
+    source = SQLiteDataSource(str(tmp_path / "thrive.sqlite3"))
+    source.import_rows("locations", generate_synthetic_data(300))
+    source.import_rows("user_profiles", generate_synthetic_profiles(20))
+    previous = data_utils._data_source
+    data_utils.set_data_source(source)
+    yield source
+    data_utils.set_data_source(previous)
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+
+def batch(app, profiles, ndjson=False):
+    if ndjson:
+        body = "\n".join(json.dumps(profile) for profile in profiles).encode()
+    else:
+        body = json.dumps(profiles).encode()
+    status, headers, chunks = app.handle_batch_recommendations_request(body, ndjson=ndjson)
+    assert status == 200
+    text = b"".join(chunks).decode()
+    if ndjson:
+        return [json.loads(line) for line in text.splitlines()]
+    return json.loads(text)
+
+
+MIXED = [
+    {"city": "San Francisco", "state": "CA", "income": 120000},
+    {"city": "San Francisco", "state": "CA", "income": "abc"},
+    {"city": "San Francisco", "state": "CA", "savings": None},
+    {"city": "San Francisco", "state": "CA", "household_size": "two"},
+    {"city": "San Francisco", "state": "CA", "income": 90000, "household_size": 2},
+]
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_invalid_entries_fail_alone(app, ndjson):
+    results = batch(app, MIXED, ndjson=ndjson)
+
+    assert len(results) == len(MIXED)
+    for i in (1, 2, 3):
+        assert results[i] == {"error": "income, savings and household_size must be numbers"}
+    for i in (0, 4):
+        assert "error" not in results[i]
+        single = app.handle_recommendations_request(MIXED[i])
+        assert results[i] == json.loads(json.dumps(single))
+
+
+BAD_TYPES = [
+    {"city": 5, "state": "CA"},
+    {"city": "San Francisco", "state": ["CA"]},
+    {"city": "San Francisco", "state": "CA", "limit": float("inf")},
+    {"city": "San Francisco", "state": "CA", "offset": float("inf")},
+    {"city": "San Francisco", "state": "CA", "income": float("inf")},
+    {"city": "San Francisco", "state": "CA", "household_size": float("inf")},
+    {"city": "San Francisco", "state": "CA", "income": 90000},
+]
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_wrong_types_and_overflow_fail_alone(app, ndjson):
+    results = batch(app, BAD_TYPES, ndjson=ndjson)
+
+    assert len(results) == len(BAD_TYPES)
+    assert all("error" in result for result in results[:-1])
+    assert "error" not in results[-1]
+
+
+@pytest.mark.parametrize("data", BAD_TYPES[:-1])
+def test_single_request_rejects_wrong_types_and_overflow(app, data):
+    status, headers, body = app.handle_request(
+        "POST", "/api/scoring/recommendations", {}, json.dumps(data).encode())
+    assert status == 400
+    assert "error" in json.loads(body)
@@ -0,0 +1,138 @@
+import threading
+
+import psycopg2
+import pytest
+from psycopg2 import extensions
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeInfo:
+    transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    """Just enough of a psycopg2 connection for the pool"""
+
+    def __init__(self):
+        self.closed = 0
+        self.alive = True
+        self.checks = 0
+        self.rollbacks = 0
+        self.info = FakeInfo()
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        self.checks += 1
+        if not self.alive:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def pool(opened):
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+    return lambda **options: ConnectionPool(connect, **options)
+
+
+def test_connections_are_reused(pool, opened):
+    db = pool(min_connections=1, max_connections=3)
+    for _ in range(5):
+        with db.connection() as conn:
+            assert conn is opened[0]
+    assert len(opened) == 1
+
+
+def test_pool_never_exceeds_max_connections(pool, opened):
+    db = pool(min_connections=0, max_connections=2, timeout=0.1)
+    first, second = db.getconn(), db.getconn()
+    with pytest.raises(PoolTimeout):
+        db.getconn()
+    assert len(opened) == 2
+
+    # A waiting caller gets the connection as soon as it is returned
+    db.timeout = 5
+    threading.Timer(0.05, db.putconn, (first,)).start()
+    assert db.getconn() is first
+    db.putconn(second)
+
+
+def test_dead_idle_connections_are_replaced(pool, opened):
+    db = pool(min_connections=2, max_connections=2, health_check_interval=0)
+    for conn in opened:
+        conn.alive = False
+    conn = db.getconn()
+    assert conn is opened[2]
+    assert opened[0].closed and opened[1].closed
+    assert db.size == 1
+
+
+def test_recently_used_connections_skip_the_health_check(pool, opened):
+    db = pool(min_connections=1, health_check_interval=60)
+    with db.connection():
+        pass
+    with db.connection():
+        pass
+    assert opened[0].checks == 0
+
+
+def test_returned_connections_are_rolled_back_or_dropped(pool, opened):
+    db = pool(min_connections=0)
+    with db.connection() as conn:
+        conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    assert conn.rollbacks == 1
+    assert db.idle[0][0] is conn
+
+    with pytest.raises(psycopg2.OperationalError):
+        with db.connection() as conn:
+            raise psycopg2.OperationalError("connection lost")
+    assert conn.closed
+    assert db.idle == [] and db.size == 0
+
+
+def test_failed_connect_frees_its_slot():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise psycopg2.OperationalError("could not connect")
+        return FakeConnection()
+
+    db = ConnectionPool(connect, min_connections=0, max_connections=1, timeout=0.1)
+    with pytest.raises(psycopg2.OperationalError):
+        db.getconn()
+    assert db.size == 0
+    assert db.getconn() is not None
+
+
+def test_closeall_closes_idle_and_returned_connections(pool, opened):
+    db = pool(min_connections=2)
+    conn = db.getconn()
+    db.closeall()
+    assert [c.closed for c in opened] == [1, 0]
+    db.putconn(conn)
+    assert conn.closed
+    with pytest.raises(psycopg2.InterfaceError):
+        db.getconn()
@@ -0,0 +1,47 @@
+import io
+import json
+import os
+
+import pytest
+
+import load_zillow_data
+from load_zillow_data import iter_json_array
+
+
+@pytest.fixture
+def listing(make_listing):
+    return lambda zpid: make_listing(zpid, note="a long string, with [brackets] and \\\"quotes\\\" " * 3)
+
+
+@pytest.fixture
+def text(listing):
+    return "[" + ", ".join([
+        json.dumps(listing(1)),
+        '{"zpid": "2", "broken": [1, 2,, {"x": "]"}]}',
+        json.dumps(listing(3)),
+        '{"zpid": "4" "missing": "comma"}',
+        json.dumps(listing(5)),
+    ]) + "]"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1024 * 1024])
+def test_malformed_elements_are_skipped(text, chunk_size):
+    offsets = []
+    elements = list(iter_json_array(io.StringIO(text), chunk_size, on_malformed=offsets.append))
+    assert [element["zpid"] for element in elements] == ["1", "3", "5"]
+    assert [text[offset:offset + 12] for offset in offsets] == ['{"zpid": "2"', '{"zpid": "4"']
+
+
+def test_malformed_elements_are_counted_as_rejected(text, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "rentals.json").write_text(text)
+    assert load_zillow_data.load_zillow_data("rentals.json")
+    assert "malformed_json: 2" in capsys.readouterr().out
+    assert [rental["zpid"] for rental in json.loads((tmp_path / "rentals.json").read_text())] == ["1", "3", "5"]
+
+
+def test_failed_load_leaves_no_temporary_files(listing, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "rentals.json").write_text("[" + json.dumps(listing(1)) + ", 1")
+    assert not load_zillow_data.load_zillow_data("rentals.json")
+    assert sorted(os.listdir(tmp_path)) == ["rentals.json"]
@@ -0,0 +1,24 @@
+import batch_recommendations
+
+
+def stored_rows(source):
+    with source.connection() as conn:
+        return conn.execute("SELECT user_id, location_id FROM user_recommendations ORDER BY user_id, location_id").fetchall()
+
+
+def test_run_batch_replaces_earlier_recommendations(sqlite_source, model_dir):
+    assert batch_recommendations.run_batch(top_k=8, user_block_size=7) == 20 * 8
+    assert batch_recommendations.run_batch(top_k=3, user_block_size=7) == 20 * 3
+    rows = stored_rows(sqlite_source)
+    assert len(rows) == 20 * 3
+    for user_id in range(1, 21):
+        best = sqlite_source.fetch_recommendations(user_id)
+        assert len(best) == 3
+
+
+def test_run_batch_for_some_users_leaves_the_others(sqlite_source, model_dir):
+    batch_recommendations.run_batch(top_k=5)
+    batch_recommendations.run_batch(user_ids=[2, 3], top_k=1)
+    rows = stored_rows(sqlite_source)
+    counts = {user_id: sum(1 for row in rows if row[0] == user_id) for user_id in range(1, 21)}
+    assert counts == {user_id: 1 if user_id in (2, 3) else 5 for user_id in range(1, 21)}
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_recommendations
+import data_utils
+import sqlite_source as sqlite_module
+from affordability_model import AffordabilityModel
+from data_utils import LocationPreprocessor, fetch_locations_data, fetch_user_profile
+from recommendation_model import RecommendationModel
+from train_models import generate_synthetic_data
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 299, 300])
+def test_chunked_fetch_matches_single_fetch(sqlite_source, monkeypatch, chunk_size):
+    whole = sqlite_source.fetch_locations()
+    monkeypatch.setattr(sqlite_module, "LOCATION_FETCH_CHUNK_SIZE", chunk_size)
+    chunked = sqlite_source.fetch_locations()
+
+    # Chunks merge their categories in the order they arrive; the values are what must match
+    pd.testing.assert_frame_equal(chunked, whole, check_categorical=False)
+    assert len(whole) == 300
+    for name in ("city", "state"):
+        assert isinstance(chunked[name].dtype, pd.CategoricalDtype)
+
+
+def test_projected_fetch_matches_full_fetch(sqlite_source):
+    whole = sqlite_source.fetch_locations()
+    columns = ["id", "state", "cost_housing", "affordability_score"]
+    projected = sqlite_source.fetch_locations(columns=columns)
+
+    assert list(projected.columns) == columns
+    pd.testing.assert_frame_equal(projected, whole[columns])
+    with pytest.raises(ValueError):
+        sqlite_source.fetch_locations(columns=["id", "no_such_column"])
+
+
+def test_concat_merges_categories_of_each_chunk():
+    schema = [("id", "integer"), ("state", "text"), ("cost_housing", "numeric")]
+    chunks = [[(1, "CA", 2500.0), (2, "TX", None)], [(3, "NY", 1800.0)], []]
+    frame = data_utils.concat_location_frames([data_utils.typed_location_frame(rows, schema) for rows in chunks])
+
+    assert frame["id"].tolist() == [1, 2, 3]
+    assert frame["state"].tolist() == ["CA", "TX", "NY"]
+    assert isinstance(frame["state"].dtype, pd.CategoricalDtype)
+    assert np.isnan(frame["cost_housing"][1])
+
+
+@pytest.fixture(scope="module")
+def training_data():
+    return generate_synthetic_data(200)
+
+
+def test_preprocessor_transforms_rows_as_in_training(training_data, tmp_path):
+    preprocessor = LocationPreprocessor().fit(training_data)
+    trained = preprocessor.transform(training_data)
+    preprocessor.save(str(tmp_path / "preprocessor.joblib"))
+    loaded = LocationPreprocessor.load(str(tmp_path / "preprocessor.joblib"))
+
+    # One row, or rows with missing values and unseen categories, must not refit anything
+    rows = training_data.iloc[[3, 50]].copy()
+    pd.testing.assert_frame_equal(loaded.transform(rows), trained.iloc[[3, 50]])
+    rows["cost_housing"] = np.nan
+    rows["state"] = "ZZ"
+    transformed = loaded.transform(rows)
+    assert not transformed.isna().any().any()
+    assert (transformed.filter(like="state_") == 0).all().all()
+
+
+def test_affordability_predictions_survive_reload(training_data, model_dir):
+    model = AffordabilityModel()
+    assert model.train(training_data)
+    expected = model.predict(training_data)
+
+    loaded = AffordabilityModel()
+    assert loaded.load()
+    np.testing.assert_allclose(loaded.predict(training_data), expected)
+    for i in (0, 17, 199):
+        np.testing.assert_allclose(loaded.predict(training_data.iloc[i].to_dict()), expected[i:i + 1])
+
+
+@pytest.mark.parametrize("trained", [False, True])
+def test_batch_top_k_matches_predict(sqlite_source, model_dir, trained):
+    if trained:
+        assert RecommendationModel().train()
+    assert batch_recommendations.run_batch(top_k=5, user_block_size=3, location_block_size=64) == 20 * 5
+
+    model = RecommendationModel()
+    model.load()
+    locations = fetch_locations_data()
+    for user_id in range(1, 21):
+        profile = fetch_user_profile(user_id)
+        profile["income"] = float(profile["income"])
+        expected = model.predict(profile, locations).head(5)
+        stored = sqlite_source.fetch_recommendations(user_id)
+        assert stored["location_id"].tolist() == expected["id"].tolist()
+        np.testing.assert_allclose(stored["match_score"], expected["match_score"], rtol=1e-6)
@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+import pytest
+
+from rental_index import RentalIndex
+
+
+@pytest.fixture
+def listing(make_listing):
+    return lambda zpid, lat, lng: make_listing(zpid, "Suva", "FJ", lat, lng)
+
+
+def test_nearby_wraps_across_antimeridian(listing):
+    index = RentalIndex([listing(1, -18.0, 179.98), listing(2, -18.0, -179.98), listing(3, -18.0, 170.0)])
+
+    for lng in (179.99, -179.99):
+        positions, distances = index.nearby(-18.0, lng, 10)
+        assert positions.tolist() == [0, 1]
+        assert (distances < 10).all()
+
+
+def test_within_bbox_rejects_unbounded_boxes(listing):
+    index = RentalIndex([listing(1, 10.0, 10.0)])
+
+    assert index.within_bbox(-1e10, -180, 1e10, 180).tolist() == [0]
+    assert index.within_bbox(np.nan, -180, 90, 180).tolist() == []
+    assert index.within_bbox(20, -180, 10, 180).tolist() == []
+
+
+def test_nearby_request_validates_bbox(app):
+    for bbox in ("-1e10,-180,1e10,180", "nan,0,10,10", "0,-inf,10,10", "10,0,0,10", "0,10,10,0", "0,0,10"):
+        status, _, body = app.handle_nearby_request({"bbox": [bbox]})
+        assert status == 400, bbox
+        assert "error" in json.loads(body)
+
+    status, _, body = app.handle_nearby_request({"bbox": ["-90,-180,90,180"]})
+    assert status == 200
+    assert json.loads(body)["count"] == len(app.rental_index.rentals)
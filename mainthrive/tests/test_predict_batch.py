@@ -0,0 +1,87 @@
+import io
+import json
+
+import pytest
+
+import predict
+from affordability_model import AffordabilityModel
+from recommendation_model import RecommendationModel
+from train_models import generate_synthetic_data
+
+
+@pytest.fixture
+def locations():
+    return generate_synthetic_data(40)
+
+
+@pytest.fixture
+def rule_based(monkeypatch, locations):
+    monkeypatch.setattr(predict, "_affordability_model", AffordabilityModel())
+    monkeypatch.setattr(predict, "_recommendation_model", RecommendationModel())
+    monkeypatch.setattr(predict, "fetch_locations_data", lambda *args, **kwargs: locations)
+
+
+@pytest.fixture
+def trained(model_dir, monkeypatch, locations):
+    model = AffordabilityModel()
+    assert model.train(locations)
+    monkeypatch.setattr(predict, "_affordability_model", model)
+    monkeypatch.setattr(predict, "fetch_locations_data", lambda *args, **kwargs: locations)
+
+
+def run(function, lines, **kwargs):
+    output = io.StringIO()
+    function(predict.read_records(lines, kwargs.pop("id_key")), output, **kwargs)
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def inline(locations, position, **changes):
+    row = json.loads(locations.iloc[[position]].to_json(orient="records"))[0]
+    row.update(changes)
+    return row
+
+
+def mixed_locations(locations):
+    good = inline(locations, 3)
+    return [
+        "4",                                                        # lookup
+        json.dumps(good),                                           # inline with id
+        json.dumps({k: v for k, v in good.items() if k != "id"}),   # inline without id
+        json.dumps(inline(locations, 5, cost_housing="abc")),       # bad field
+        json.dumps(inline(locations, 6, id="x")),                   # bad id
+        '{"location_id": "y"}',
+        "10000",                                                    # unknown id
+        json.dumps(inline(locations, 7)),
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+@pytest.mark.parametrize("model", ["rule_based", "trained"])
+def test_bad_affordability_records_fail_alone(request, locations, model, chunk_size):
+    request.getfixturevalue(model)
+    results = run(predict.batch_affordability, mixed_locations(locations), id_key="location_id",
+                  chunk_size=chunk_size)
+
+    assert [result.get("location_id") for result in results] == [4, 4, None, 6, "x", "y", 10000, 8]
+    assert [("error" in result) for result in results] == [False, False, False, True, True, True, True, False]
+    assert "cost_housing" in results[3]["error"]
+    # Every scored record matches the single-location command
+    for result in (results[0], results[1], results[7]):
+        single = predict.affordability_result(locations, result["location_id"], predict._affordability_model)
+        assert result == single
+    assert results[2]["affordability_score"] == results[1]["affordability_score"]
+
+
+def test_bad_profiles_fail_alone(rule_based):
+    profile = {"income": 90000, "housing_budget_preference": "30-40", "requires_healthcare": True,
+               "transportation_preference": "car", "safety_importance": "very-important"}
+    lines = [json.dumps(profile), json.dumps(dict(profile, income="abc")),
+             json.dumps(dict(profile, transportation_preference=["car"])),
+             json.dumps(dict(profile, user_id="u1")), json.dumps(dict(profile, income="nan")),
+             json.dumps(profile)]
+    results = run(predict.batch_recommendations, lines, id_key="user_id", chunk_size=100, limit=3)
+
+    assert [("error" in result) for result in results] == [False, True, True, True, True, False]
+    assert "income" in results[1]["error"]
+    assert results[0] == results[5]
+    assert len(results[0]["recommendations"]) == 3
@@ -0,0 +1,34 @@
+import pytest
+
+import predict
+from affordability_model import AffordabilityModel
+from data_utils import fetch_locations_data
+from recommendation_model import RecommendationModel
+
+
+@pytest.fixture
+def worker(sqlite_source):
+    worker = predict.PredictionWorker(threads=1)
+    worker.state = (AffordabilityModel(), RecommendationModel(), fetch_locations_data())
+    return worker
+
+
+@pytest.mark.parametrize("limit, count", [(None, 10), (3, 3), ("4", 4)])
+def test_recommendations_limit(worker, limit, count):
+    request = {"id": 1, "command": "recommendations", "user_id": 2}
+    if limit is not None:
+        request["limit"] = limit
+    assert len(worker.handle(request)["recommendations"]) == count
+
+
+@pytest.mark.parametrize("request_, message", [
+    ({"command": "recommendations", "user_id": 2, "limit": "ten"}, "limit must be an integer"),
+    ({"command": "recommendations", "user_id": 2, "limit": -1}, "limit must be positive"),
+    ({"command": "recommendations", "user_id": 2, "limit": 0}, "limit must be positive"),
+    ({"command": "recommendations"}, "Missing required field: user_id"),
+    ({"command": "affordability", "location_id": "x"}, "location_id must be an integer"),
+    ({"user_id": 2}, "Missing required field: command"),
+])
+def test_invalid_requests_get_clear_errors(worker, request_, message):
+    with pytest.raises(ValueError, match=message):
+        worker.handle(request_)
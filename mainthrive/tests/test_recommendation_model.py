@@ -0,0 +1,99 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_recommendations import top_k_keys, decode_keys
+from recommendation_model import RecommendationModel
+from train_models import generate_synthetic_data
+
+PROFILES = [
+    {"income": income, "housing_budget_preference": budget, "requires_healthcare": healthcare,
+     "transportation_preference": transport, "safety_importance": safety}
+    for income, budget, healthcare, transport, safety in itertools.product(
+        [30000, 85000.5, 240000],
+        ["less-than-30", "30-40", "40-plus"],
+        [True, False],
+        ["public-transit", "bike-walking", "car", "none"],
+        ["very-important", "somewhat-important", "not-important"])
+]
+
+
+@pytest.fixture(scope="module")
+def locations():
+    return generate_synthetic_data(400)
+
+
+def test_vectorized_scores_match_scalar(locations):
+    model = RecommendationModel()
+    for profile in PROFILES:
+        scalar = [model.calculate_match_score(location, profile) for _, location in locations.iterrows()]
+        assert model.calculate_match_scores(locations, profile).tolist() == scalar
+
+
+def test_score_matrix_matches_per_profile_scores(locations):
+    model = RecommendationModel()
+    matrix = model.match_score_matrix(model.encode_locations(locations),
+                                      model.encode_user_profiles(pd.DataFrame(PROFILES)))
+    for row, profile in zip(matrix, PROFILES):
+        assert row.tolist() == model.calculate_match_scores(locations, profile).tolist()
+
+
+def test_predict_breaks_ties_like_batch_top_k(locations):
+    model = RecommendationModel()
+    encoded = model.encode_locations(locations)
+    users = model.encode_user_profiles(pd.DataFrame(PROFILES))
+    keys = top_k_keys(model, encoded, np.arange(len(locations)), users, 25, location_block_size=64)
+    positions, scores = decode_keys(keys, len(locations))
+    for profile, user_positions, user_scores in zip(PROFILES, positions, scores):
+        predicted = model.predict(profile, locations).head(25)
+        assert predicted["id"].tolist() == locations["id"].iloc[user_positions].tolist()
+        assert predicted["match_score"].tolist() == user_scores.tolist()
+
+
+def classify_by_cost(rows):
+    return (rows["cost_housing"].to_numpy() > 1500).astype(np.int32)
+
+
+def test_cluster_index_relabels_rows_by_their_own_updated_at(locations):
+    from recommendation_model import ClusterIndex
+
+    frame = locations.assign(updated_at=pd.Timestamp("2026-01-01") + pd.to_timedelta(np.arange(len(locations)), "s"))
+    index = ClusterIndex()
+    index.sync(frame, classify_by_cost)
+    classified = []
+
+    def classify(rows):
+        classified.extend(rows["id"])
+        return classify_by_cost(rows)
+
+    # A late commit: the row changed, but its updated_at is older than the newest one seen
+    late = frame.copy()
+    late.loc[3, "cost_housing"] = 3000.0 if late.loc[3, "cost_housing"] <= 1500 else 500.0
+    late.loc[3, "updated_at"] = frame["updated_at"].iloc[10] - pd.Timedelta("1h")
+    assert index.sync(late, classify)
+    assert classified == [late.loc[3, "id"]]
+    position = int(np.flatnonzero(late["id"] == late.loc[3, "id"])[0])
+    labels = {cluster: set(positions) for cluster, positions in index.partitions.items()}
+    assert position in labels[int(classify_by_cost(late.loc[[3]])[0])]
+
+    classified.clear()
+    assert not index.sync(late.copy(), classify)
+    assert classified == []
+
+
+def test_cluster_index_saves_through_a_per_process_temporary_file(locations, model_dir, monkeypatch):
+    import os
+    from recommendation_model import ClusterIndex
+
+    written = []
+    real_replace = os.replace
+    monkeypatch.setattr(os, "replace", lambda src, dst: (written.append(src), real_replace(src, dst)))
+    index = ClusterIndex()
+    index.sync(locations, classify_by_cost)
+    index.save()
+
+    assert written == [f"{model_dir / 'location_clusters.joblib'}.{os.getpid()}.tmp"]
+    assert ClusterIndex.load().labels.tolist() == index.labels.tolist()
+    assert sorted(os.listdir(model_dir)) == ["location_clusters.joblib"]
@@ -0,0 +1,156 @@
+import gzip
+import json
+import random
+
+import pytest
+
+from rental_index import RentalIndex
+from rental_store import RentalFile
+
+CITIES = ["San Francisco", "South San Francisco", "San Jose", "Santa Cruz", "Austin", "Boston", "Sanford"]
+STATES = ["CA", "TX", "MA", "FL"]
+
+
+@pytest.fixture(scope="module")
+def rentals():
+    rng = random.Random(7)
+    return [{"zpid": str(i), "addressCity": rng.choice(CITIES), "addressState": rng.choice(STATES),
+             "units": [{"price": f"${rng.randrange(500, 4000):,}", "beds": "1"}
+                       for _ in range(rng.randrange(0, 3))]}
+            for i in range(500)]
+
+
+def linear_filter(rentals, city, state):
+    """The full scan /api/rentals did before the index"""
+    return [rental for rental in rentals
+            if (not city or city.lower() in rental.get('addressCity', '').lower()) and
+               (not state or state.upper() == rental.get('addressState', ''))]
+
+
+def linear_budget_filter(rentals, monthly_budget):
+    return [rental for rental in rentals
+            if any(float(unit['price'].replace("$", "").replace(",", "")) <= monthly_budget
+                   for unit in rental['units'])]
+
+
+QUERIES = [(None, None), ("san", None), ("SAN", "ca"), ("San Francisco", "CA"), ("francisco", None),
+           ("an", "TX"), ("o", "MA"), (None, "fl"), ("Sanford", "FL"), ("Nowhere", None), ("austin", "XX")]
+
+
+@pytest.fixture(params=["list", "file"])
+def index(request, rentals, tmp_path):
+    if request.param == "list":
+        return RentalIndex(rentals)
+    path = tmp_path / "rentals.json"
+    path.write_text(json.dumps(rentals))
+    return RentalIndex.from_snapshot(RentalFile(str(path)))
+
+
+@pytest.mark.parametrize("city,state", QUERIES)
+def test_lookup_matches_linear_filter(index, rentals, city, state):
+    assert index.listings(index.lookup(city, state)) == linear_filter(rentals, city, state)
+
+
+@pytest.mark.parametrize("budget", [0, 499, 1200, 2500.5, 10000])
+def test_affordable_matches_linear_filter(index, rentals, budget):
+    positions = index.lookup("san", "CA")
+    expected = linear_budget_filter(linear_filter(rentals, "san", "CA"), budget)
+    assert index.listings(index.affordable(positions, budget)) == expected
+
+
+@pytest.fixture
+def serve(app, rentals, monkeypatch):
+    index = RentalIndex(rentals, version="test-api")
+    monkeypatch.setattr(app, "rental_index", index)
+    monkeypatch.setattr(app, "rentals_data", index.rentals)
+    app.response_cache.invalidate()
+    yield index
+    app.response_cache.invalidate()
+
+
+def get(app, path, headers=None):
+    status, response_headers, body = app.handle_request("GET", path, headers or {}, b"")
+    if not isinstance(body, bytes):
+        body = b"".join(body)
+    return status, dict(response_headers), body
+
+
+@pytest.mark.parametrize("limit", [1, 7, 100])
+@pytest.mark.parametrize("query", ["", "&city=san", "&state=TX", "&city=o&state=ma"])
+def test_cursor_pages_cover_the_full_result(app, serve, rentals, limit, query):
+    params = dict(pair.split("=") for pair in query.strip("&").split("&") if pair)
+    pages = []
+    path = f"/api/rentals?limit={limit}{query}"
+    while True:
+        status, headers, body = get(app, path)
+        assert status == 200
+        page = json.loads(body)
+        assert len(page) <= limit
+        pages.extend(page)
+        if "X-Next-Cursor" not in headers:
+            break
+        assert len(page) == limit
+        path = f"/api/rentals?limit={limit}{query}&cursor={headers['X-Next-Cursor']}"
+    assert pages == linear_filter(rentals, params.get("city"), params.get("state"))
+
+
+@pytest.mark.parametrize("stream", ["stream=1", "format=ndjson"])
+def test_streamed_pages_match_json_pages(app, serve, stream):
+    _, headers, body = get(app, "/api/rentals?city=san&limit=50")
+    _, streamed_headers, streamed = get(app, f"/api/rentals?city=san&limit=50&{stream}")
+    assert streamed_headers["X-Next-Cursor"] == headers["X-Next-Cursor"]
+    if stream == "format=ndjson":
+        assert [json.loads(line) for line in streamed.splitlines()] == json.loads(body)
+    else:
+        assert streamed == body
+
+
+def test_invalid_cursor_and_limit_are_rejected(app, serve, monkeypatch):
+    _, headers, _ = get(app, "/api/rentals?limit=5")
+    cursor = headers["X-Next-Cursor"]
+    for path in ["/api/rentals?limit=0", "/api/rentals?limit=-3", "/api/rentals?limit=ten",
+                 "/api/rentals?limit=5&cursor=not-a-cursor"]:
+        status, _, body = get(app, path)
+        assert status == 400, path
+        assert "error" in json.loads(body)
+
+    # Cursors from an earlier dataset are refused rather than resumed at a shifted position
+    reloaded = RentalIndex(serve.rentals, version="test-api-reloaded")
+    monkeypatch.setattr(app, "rental_index", reloaded)
+    status, _, _ = get(app, f"/api/rentals?limit=5&cursor={cursor}")
+    assert status == 400
+
+
+def test_etag_returns_304_until_the_data_changes(app, serve, rentals, monkeypatch):
+    status, headers, body = get(app, "/api/rentals?city=San&state=ca")
+    assert status == 200
+    assert json.loads(body) == linear_filter(rentals, "San", "CA")
+    etag = headers["ETag"]
+
+    # The same query in another case shares the cache entry and its ETag
+    status, headers, body = get(app, "/api/rentals?city=SAN&state=CA", {"if-none-match": etag})
+    assert status == 304
+    assert headers["ETag"] == etag
+    assert body == b""
+
+    status, headers, _ = get(app, "/api/rentals?city=san&state=TX", {"if-none-match": etag})
+    assert status == 200
+    assert headers["ETag"] != etag
+
+    app.set_rental_index(RentalIndex(rentals, version="test-api-reloaded"))
+    status, headers, body = get(app, "/api/rentals?city=san&state=CA", {"if-none-match": etag})
+    assert status == 200
+    assert headers["ETag"] != etag
+
+
+def test_gzip_response_and_its_etag(app, serve, rentals):
+    _, plain_headers, plain = get(app, "/api/rentals?state=CA")
+    status, headers, body = get(app, "/api/rentals?state=CA", {"accept-encoding": "gzip, deflate"})
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(body) == plain
+    assert headers["ETag"] != plain_headers["ETag"]
+
+    for etag in (headers["ETag"], plain_headers["ETag"]):
+        status, _, _ = get(app, "/api/rentals?state=CA", {"if-none-match": etag, "accept-encoding": "gzip"})
+        assert status == 304
@@ -0,0 +1,60 @@
+import json
+import os
+import time
+
+import pytest
+
+from rental_index import RentalIndex
+from rental_store import RentalFile, StaleRentalFileError
+
+
+def write_rentals(path, rentals):
+    with open(path, "w") as f:
+        json.dump(rentals, f)
+
+
+def rewrite_in_place(path, rentals):
+    # Same inode, new contents, as an editor or a non-atomic writer would leave it
+    with open(path, "r+") as f:
+        f.write(json.dumps(rentals))
+        f.truncate()
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+
+def test_replaced_file_keeps_serving_loaded_listings(make_listing, tmp_path):
+    path = tmp_path / "rentals.json"
+    write_rentals(path, [make_listing(1), make_listing(2)])
+    rentals = RentalFile(str(path))
+    write_rentals(str(path) + ".tmp", [make_listing(3)])
+    os.replace(str(path) + ".tmp", path)
+    assert rentals[1] == make_listing(2)
+
+
+def test_file_rewritten_in_place_is_not_served(make_listing, tmp_path):
+    path = tmp_path / "rentals.json"
+    write_rentals(path, [make_listing(1), make_listing(2)])
+    rentals = RentalFile(str(path))
+    rewrite_in_place(path, [make_listing(30), make_listing(40)])
+    with pytest.raises(StaleRentalFileError):
+        rentals.raw(1)
+
+
+def test_stale_file_returns_503_and_reloads(make_listing, app, tmp_path, monkeypatch):
+    path = tmp_path / "rentals.json"
+    write_rentals(path, [make_listing(1), make_listing(2)])
+    stale = RentalIndex.from_snapshot(RentalFile(str(path)), version="stale")
+    monkeypatch.setattr(app, "rental_index", stale)
+    monkeypatch.setattr(app, "rentals_data", stale.rentals)
+    rewrite_in_place(path, [make_listing(30), make_listing(40)])
+
+    status, headers, body = app.handle_request("GET", "/api/rentals?state=TX", {}, b"")
+    assert status == 503
+    assert ("Retry-After", "1") in headers
+
+    deadline = time.time() + 10
+    while app.rental_index is stale and time.time() < deadline:
+        time.sleep(0.01)
+    assert app.rental_index is not stale
+    status, headers, body = app.handle_request("GET", "/api/rentals?state=TX", {}, b"")
+    assert status == 200